@@ -1,37 +1,166 @@
 import streamlit as st
-import requests
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+from utils.async_client import APIError, get_async_client
+from utils.resilience import UNAVAILABLE_ERRORS
+from utils.tokens import count_tokens, count_message_tokens
+
 class AzureOpenAIChat:
     def __init__(self):
         self.API_ENDPOINT = st.secrets.get("AZURE_OPENAI_API_ENDPOINT", "")
         self.API_KEY = st.secrets.get("AZURE_OPENAI_API_KEY", "")
+        self.client = get_async_client()
+        self.last_timings: Dict[str, float] = {}
 
-    def generate_response(self, query: str, max_tokens: int = 300) -> Dict[str, Any]:
-        """Generate response from Azure OpenAI"""
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.API_KEY,
-        }
-        data = {
-            "messages": [{"role": "user", "content": query}],
+    def _build_request(self, query: str, max_tokens: int,
+                       context: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        return {
+            "messages": list(context or []) + [{"role": "user", "content": query}],
             "max_tokens": max_tokens,
             "temperature": 0.7,
             "top_p": 1,
             "frequency_penalty": 0,
             "presence_penalty": 0,
         }
-        response = requests.post(self.API_ENDPOINT, headers=headers, json=data)
-        response.raise_for_status()  # Automatically raises an error for HTTP issues
-        return response.json()
+
+    def generate_response(self, query: str, max_tokens: int = 300,
+                          context: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """Generate response from Azure OpenAI"""
+        data = self._build_request(query, max_tokens, context=context)
+        start = time.perf_counter()
+        # Raises APIError for HTTP issues
+        result = self.client.run(self.client.chat_completion(self.API_ENDPOINT, self.API_KEY, data))
+        total = time.perf_counter() - start
+        self.last_timings = {"time_to_first_token": total, "total_duration": total}
+        return result
+
+    def stream_response(self, query: str, max_tokens: int = 300,
+                        context: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+        """
+        Stream the response from Azure OpenAI as server-sent events,
+        yielding content deltas as they arrive.
+
+        Time-to-first-token and total duration are stored in last_timings
+        once the stream is exhausted.
+        """
+        data = self._build_request(query, max_tokens, context=context)
+        self.last_timings = {}
+        start = time.perf_counter()
+        first_token = None
+
+        chunks = self.client.chat_completion_stream(self.API_ENDPOINT, self.API_KEY, data)
+        try:
+            for chunk in self.client.iterate(chunks):
+                # Azure sends a first chunk with prompt filter results and no choices
+                if not chunk.get("choices"):
+                    continue
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    yield content
+        finally:
+            total = time.perf_counter() - start
+            self.last_timings = {
+                "time_to_first_token": first_token if first_token is not None else total,
+                "total_duration": total,
+            }
+
+class ConversationContext:
+    """
+    Token-budgeted view of the chat history.
+
+    The newest turns are packed into the budget; turns that fall out of the
+    window are folded into a rolling summary exactly once, so the request
+    size stays bounded however long the session runs. When the window
+    overflows it is trimmed to evict_to of the budget in one go, so the
+    summary is updated once every several turns rather than on every turn.
+    """
+
+    def __init__(self, budget_tokens: int = 2000, summary_tokens: int = 300, evict_to: float = 0.5):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.evict_to = evict_to
+        self.summary = ""
+        # history[:summarized_upto] has already been folded into the summary
+        self.summarized_upto = 0
+
+    def _window_start(self, history: List[Dict[str, str]], available: int) -> int:
+        """Index of the oldest unsummarized turn from which the newest turns fit in available tokens"""
+        window_start = len(history)
+        for i in range(len(history) - 1, self.summarized_upto - 1, -1):
+            cost = count_message_tokens(history[i])
+            if cost > available:
+                break
+            available -= cost
+            window_start = i
+        return window_start
+
+    def build(self, history: List[Dict[str, str]], query: str,
+              chat_client: "AzureOpenAIChat") -> List[Dict[str, str]]:
+        """Return the context messages to send ahead of query"""
+        # Room for the summary is reserved up front so the total stays within budget
+        available = self.budget_tokens - self.summary_tokens - count_tokens(query)
+        window_start = self._window_start(history, available)
+
+        # Only turns evicted since the last call are summarized, and once
+        # anything has to go the window is cut back well below the budget
+        if window_start > self.summarized_upto:
+            window_start = max(window_start, self._window_start(history, int(available * self.evict_to)))
+            evicted = history[self.summarized_upto:window_start]
+            self.summary = self._update_summary(evicted, chat_client)
+            self.summarized_upto = window_start
+
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {self.summary}",
+            })
+        messages.extend(
+            {"role": m["role"], "content": m["content"]} for m in history[window_start:]
+        )
+        return messages
+
+    def _update_summary(self, evicted: List[Dict[str, str]], chat_client: "AzureOpenAIChat") -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+        prompt = (
+            "Update the running summary of a conversation with the new turns below. "
+            "Keep names, facts, decisions and open questions; drop small talk. "
+            f"Answer in at most {self.summary_tokens * 3 // 4} words.\n\n"
+            f"Current summary:\n{self.summary or '(empty)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        response = chat_client.generate_response(prompt, max_tokens=self.summary_tokens)
+        if response and "choices" in response:
+            return response["choices"][0]["message"]["content"]
+        return self.summary
 
 def main():
     st.set_page_config(page_title="Azure OpenAI Chat", page_icon="💬")
     st.title("Azure OpenAI GPT-4o Chat")
 
+    with st.sidebar:
+        stream_enabled = st.toggle("Stream responses", value=True)
+        context_budget = st.slider(
+            "Context budget (tokens)",
+            min_value=500,
+            max_value=8000,
+            value=2000,
+            step=250,
+            help="Maximum tokens of conversation history sent with each message"
+        )
+
     # Initialize chat history in session state
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "response_timings" not in st.session_state:
+        st.session_state.response_timings = []
+    if "conversation_context" not in st.session_state:
+        st.session_state.conversation_context = ConversationContext()
+    st.session_state.conversation_context.budget_tokens = context_budget
 
     # Chat input
     if prompt := st.chat_input("Enter your message"):
@@ -42,21 +171,48 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Display "Generating response..." message
-        with st.spinner("Generating response..."):
-            # Generate AI response
-            chat_client = AzureOpenAIChat()
-            response = chat_client.generate_response(prompt)
-            
-            # Process and display the assistant's response
-            if response and "choices" in response:
-                full_response = response["choices"][0]["message"]["content"]
+        chat_client = AzureOpenAIChat()
+        try:
+            context = st.session_state.conversation_context.build(
+                st.session_state.messages[:-1], prompt, chat_client
+            )
+
+            if stream_enabled:
+                # Render tokens as they arrive instead of waiting for the full completion
                 with st.chat_message("assistant"):
-                    st.markdown(full_response)
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+                    full_response = st.write_stream(chat_client.stream_response(prompt, context=context))
+                if full_response:
+                    st.session_state.messages.append({"role": "assistant", "content": full_response})
+                else:
+                    with st.chat_message("assistant"):
+                        st.markdown("Sorry, I couldn't generate a response.")
             else:
-                with st.chat_message("assistant"):
-                    st.markdown("Sorry, I couldn't generate a response.")
+                # Display "Generating response..." message
+                with st.spinner("Generating response..."):
+                    # Generate AI response
+                    response = chat_client.generate_response(prompt, context=context)
+
+                    # Process and display the assistant's response
+                    if response and "choices" in response:
+                        full_response = response["choices"][0]["message"]["content"]
+                        with st.chat_message("assistant"):
+                            st.markdown(full_response)
+                        st.session_state.messages.append({"role": "assistant", "content": full_response})
+                    else:
+                        with st.chat_message("assistant"):
+                            st.markdown("Sorry, I couldn't generate a response.")
+        except (APIError,) + UNAVAILABLE_ERRORS as e:
+            st.error(f"Could not get a response: {e}")
+            return
+
+        # Record latency for this reply
+        timings = chat_client.last_timings
+        if timings:
+            st.session_state.response_timings.append(timings)
+            st.caption(
+                f"First token after {timings['time_to_first_token']:.2f}s • "
+                f"completed in {timings['total_duration']:.2f}s"
+            )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
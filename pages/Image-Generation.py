@@ -1,13 +1,20 @@
-import requests
 import base64
-import io
-from PIL import Image
+import itertools
+from concurrent.futures import as_completed
 import streamlit as st
 
+from utils.async_client import get_async_client
+from utils.cache import make_key, normalize_text
+from utils.images import get_image_store
+from utils.transport import get_transport
+
 class ImageGenerator:
     def __init__(self):
         self.API_ENDPOINT = "https://access-01.openai.azure.com/openai/deployments/dall-e-3/images/generations?api-version=2024-02-01"
         self.API_KEY = st.secrets.get("AZURE_DALLE_API_KEY", "")
+        # DALL-E deployments have a far smaller quota than chat deployments
+        self.client = get_async_client()
+        self.client.set_rate_limit(self.API_ENDPOINT, float(st.secrets.get("AZURE_DALLE_RPM", 6)))
     
     def generate_image(self, prompt, size="1024x1024", quality="standard", n=1):
         """
@@ -22,11 +29,6 @@ class ImageGenerator:
         Returns:
             List of image URLs or base64 data depending on response format
         """
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.API_KEY
-        }
-        
         payload = {
             "prompt": prompt,
             "size": size,
@@ -35,14 +37,8 @@ class ImageGenerator:
         }
         
         try:
-            response = requests.post(
-                self.API_ENDPOINT,
-                headers=headers,
-                json=payload,
-                timeout=60  # DALL-E generation can take time
-            )
-            response.raise_for_status()
-            result = response.json()
+            client = self.client
+            result = client.run(client.image_generation(self.API_ENDPOINT, self.API_KEY, payload))
             
             # Process response data
             # The exact structure depends on the API, but usually returns
@@ -53,6 +49,79 @@ class ImageGenerator:
         except Exception as e:
             raise Exception(f"Image generation request failed: {str(e)}")
 
+    def image_key(self, prompt, size, quality, variant=0):
+        """Content-addressed key of a generated image in the image store"""
+        return make_key(normalize_text(prompt), size, quality, variant, self.API_ENDPOINT)
+
+    def generate_variants(self, prompt, variants):
+        """
+        Generate one image per (size, quality) pair in variants concurrently.
+
+        DALL-E 3 only accepts n=1, so each variant is its own request. They
+        are all submitted at once to the shared async client, which paces
+        them with this deployment's rate limiter. Yields
+        (index, size, quality, result, error) in completion order, so each
+        image can be shown as soon as it is ready.
+        """
+        futures = {
+            self.client.submit(self.client.image_generation(self.API_ENDPOINT, self.API_KEY, {
+                "prompt": prompt,
+                "size": size,
+                "quality": quality,
+                "n": 1
+            })): (i, size, quality)
+            for i, (size, quality) in enumerate(variants)
+        }
+        try:
+            for future in as_completed(futures):
+                i, size, quality = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield i, size, quality, None, e
+                else:
+                    yield i, size, quality, result.get("data", result), None
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def store_image(store, key, img_data):
+    """Download or decode one item of the API response into the image store"""
+    if "url" in img_data:
+        # Fetched once over the pooled connection, then served from disk
+        response = get_transport().get(img_data["url"])
+        response.raise_for_status()
+        data = response.content
+    elif "b64_json" in img_data:
+        data = base64.b64decode(img_data["b64_json"])
+    else:
+        raise Exception("Unexpected response format")
+    store.put(key, data)
+
+
+def show_image(store, key, caption):
+    """Render the compact preview of a stored image, with the original as a download"""
+    preview = store.derivative(key, "preview")
+    st.image(preview, caption=caption)
+    original_bytes, preview_bytes, _ = store.sizes(key)
+    st.caption(f"Preview {preview_bytes / 1024:.0f} KB • original {original_bytes / 1024:.0f} KB")
+    st.download_button(
+        "Download original",
+        data=store.original(key),
+        file_name=f"image_{key[:12]}.png",
+        mime="image/png",
+        key=f"download_{key}"
+    )
+
+
+def remember_image(key, caption):
+    """Keep the image on screen across reruns without generating it again"""
+    images = st.session_state.setdefault("generated_images", [])
+    if not any(image["key"] == key for image in images):
+        images.append({"key": key, "caption": caption})
+
+
 # Example usage in Streamlit
 def add_image_generation_tab():
     st.header("Image Generation")
@@ -80,30 +149,100 @@ def add_image_generation_tab():
             value="standard"
         )
     
+    variants_mode = st.toggle(
+        "Variants mode",
+        value=False,
+        help="Generate several candidates in parallel, optionally across sizes and qualities"
+    )
+    if variants_mode:
+        vcol1, vcol2, vcol3 = st.columns(3)
+        with vcol1:
+            variant_count = st.slider("Variants", min_value=2, max_value=8, value=4)
+        with vcol2:
+            variant_sizes = st.multiselect("Sizes", ["1024x1024", "1792x1024", "1024x1792"], default=[size])
+        with vcol3:
+            variant_qualities = st.multiselect("Qualities", ["standard", "hd"], default=[quality])
+
+    store = get_image_store()
+
     # Generate button
-    if st.button("Generate Image") and prompt:
+    if variants_mode and st.button("Generate Variants") and prompt:
+        combinations = list(itertools.product(variant_sizes or [size], variant_qualities or [quality]))
+        variants = [combinations[i % len(combinations)] for i in range(variant_count)]
+        generator = ImageGenerator()
+        keys = [generator.image_key(prompt, variant_size, variant_quality, i)
+                for i, (variant_size, variant_quality) in enumerate(variants)]
+        st.session_state.generated_images = []
+
+        # One slot per variant, filled in whichever order the images finish
+        grid = st.columns(2)
+        slots = []
+        for i, (variant_size, variant_quality) in enumerate(variants):
+            with grid[i % 2]:
+                slot = st.empty()
+                slot.info(f"Generating variant {i + 1} ({variant_size}, {variant_quality})...")
+                slots.append(slot)
+
+        def show_variant(i, variant_size, variant_quality):
+            caption = f"Variant {i + 1} • {variant_size} • {variant_quality}"
+            try:
+                with slots[i].container():
+                    show_image(store, keys[i], caption)
+            except Exception as e:
+                slots[i].error(f"Variant {i + 1} could not be displayed: {str(e)}")
+                return
+            remember_image(keys[i], caption)
+
+        # Variants already in the store are not generated again
+        missing = []
+        for i, (variant_size, variant_quality) in enumerate(variants):
+            if store.has(keys[i]):
+                show_variant(i, variant_size, variant_quality)
+            else:
+                missing.append(i)
+
+        outcomes = generator.generate_variants(prompt, [variants[i] for i in missing])
+        for j, variant_size, variant_quality, result, error in outcomes:
+            i = missing[j]
+            try:
+                if error is not None:
+                    raise error
+                if not result:
+                    raise Exception("No image was generated")
+                store_image(store, keys[i], result[0])
+            except Exception as e:
+                slots[i].error(f"Variant {i + 1} failed: {str(e)}")
+            else:
+                show_variant(i, variant_size, variant_quality)
+
+    elif not variants_mode and st.button("Generate Image") and prompt:
         with st.spinner("Generating your image..."):
             try:
                 generator = ImageGenerator()
-                result = generator.generate_image(prompt, size, quality)
-                
-                # Display the generated image(s)
-                if result:
-                    for i, img_data in enumerate(result):
-                        if "url" in img_data:
-                            st.image(img_data["url"], caption=f"Generated Image {i+1}")
-                        elif "b64_json" in img_data:
-                            # If response is base64 encoded
-                            image_bytes = base64.b64decode(img_data["b64_json"])
-                            image = Image.open(io.BytesIO(image_bytes))
-                            st.image(image, caption=f"Generated Image {i+1}")
-                        else:
-                            st.warning("Unexpected response format")
-                else:
-                    st.warning("No images were generated")
+                key = generator.image_key(prompt, size, quality)
+                st.session_state.generated_images = []
+                if not store.has(key):
+                    result = generator.generate_image(prompt, size, quality)
+                    if not result:
+                        st.warning("No images were generated")
+                        return
+                    store_image(store, key, result[0])
+                remember_image(key, "Generated Image 1")
+                show_image(store, key, "Generated Image 1")
             except Exception as e:
                 st.error(f"Error generating image: {str(e)}")
 
+    # Reruns (e.g. after a download) show the stored images instead of regenerating them
+    elif st.session_state.get("generated_images"):
+        grid = st.columns(2) if len(st.session_state.generated_images) > 1 else [st.container()]
+        for i, image in enumerate(st.session_state.generated_images):
+            if store.has(image["key"]):
+                with grid[i % len(grid)]:
+                    try:
+                        show_image(store, image["key"], image["caption"])
+                    except Exception as e:
+                        st.error(f"{image['caption']} could not be displayed: {str(e)}")
+
 # Example of how to add this to your Streamlit app
 if __name__ == "__main__":
     st.title("AI Image Generator")
@@ -1,11 +1,28 @@
 import streamlit as st
-import requests
 import json
 import base64
 import io
-from PIL import Image, ImageDraw, ImageFont
+import math
 import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 import os
+import tempfile
+
+try:
+    import cv2  # optional; only needed for video mode
+except ImportError:
+    cv2 = None
+
+from utils.boxes import non_max_suppression, tile_grid
+from utils.images import dhash, hamming_distance
+from utils.progress import ProgressTracker
+from utils.ratelimit import RateLimiter
+from utils.text import pack_batches
+from utils.transport import get_transport
 
 # Set page configuration
 st.set_page_config(
@@ -18,6 +35,28 @@ st.set_page_config(
 # Get API key from Streamlit secrets
 API_KEY = st.secrets.get("GOOGLE_CLOUD_VISION_API_KEY", "")
 
+# Relative weight of each pipeline stage on the progress bar
+DETECTION_STAGES = {"upload": 5, "preprocess": 10, "encode": 5, "request": 65, "render": 15}
+
+# Longest side of the image sent to the API. Object vertices come back
+# normalized to [0, 1], so a smaller upload still maps onto the original.
+MAX_UPLOAD_SIDE = int(st.secrets.get("VISION_MAX_SIDE", 1600))
+UPLOAD_JPEG_QUALITY = int(st.secrets.get("VISION_JPEG_QUALITY", 85))
+
+VISION_URL = "https://vision.googleapis.com/v1/images:annotate"
+
+# images:annotate takes at most 16 images per call; the JSON body is kept
+# well under the request size limit
+BATCH_IMAGE_TYPES = ["jpg", "jpeg", "png"]
+MAX_IMAGES_PER_REQUEST = 16
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+
+VIDEO_TYPES = ["mp4", "mov", "avi", "mkv", "webm"]
+# Longest side and most frames of the annotated clip; longer videos are
+# subsampled evenly so memory and GIF size stay bounded
+CLIP_FRAME_SIDE = 640
+MAX_CLIP_FRAMES = 120
+
 # Custom CSS for a professional look
 st.markdown("""
     <style>
@@ -77,38 +116,293 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def detect_objects_google_vision(image_bytes):
+def preprocess_image(image, max_side=MAX_UPLOAD_SIDE, quality=UPLOAD_JPEG_QUALITY):
+    """
+    Downscale a decoded image so its longest side is at most max_side and
+    re-encode it as JPEG for upload. The aspect ratio is kept, so boxes
+    drawn from the normalized vertices line up with the original image.
+    """
+    upload = image.convert("RGB")
+    if max(upload.size) > max_side:
+        upload.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = io.BytesIO()
+    upload.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+def base64_size(data):
+    """Size of data once base64-encoded into the JSON request body"""
+    return (len(data) + 2) // 3 * 4
+
+def stage_duration(progress, stage):
+    for row in progress.timings():
+        if row["stage"] == stage:
+            return row["duration"] or 0.0
+    return 0.0
+
+def image_request(encoded_image):
+    """One entry of the annotate call's "requests" list"""
+    return {
+        "image": {
+            "content": encoded_image
+        },
+        "features": [
+            {
+                "type": "OBJECT_LOCALIZATION",
+                "maxResults": 20
+            },
+            {
+                "type": "LABEL_DETECTION",
+                "maxResults": 10
+            }
+        ]
+    }
+
+def detect_objects_google_vision(image_bytes, progress=None):
     """
     Detect objects in an image using Google Cloud Vision API
     """
+    progress = progress or ProgressTracker(DETECTION_STAGES)
+
     # Encode image to base64
+    progress.start("encode")
     encoded_image = base64.b64encode(image_bytes).decode('UTF-8')
     
     # Prepare request to the Vision API
-    url = f"https://vision.googleapis.com/v1/images:annotate?key={API_KEY}"
+    url = f"{VISION_URL}?key={API_KEY}"
     
     request_data = {
-        "requests": [
-            {
-                "image": {
-                    "content": encoded_image
-                },
-                "features": [
-                    {
-                        "type": "OBJECT_LOCALIZATION",
-                        "maxResults": 20
-                    },
-                    {
-                        "type": "LABEL_DETECTION",
-                        "maxResults": 10
-                    }
-                ]
-            }
-        ]
+        "requests": [image_request(encoded_image)]
     }
     
-    response = requests.post(url, json=request_data)
-    return response.json()
+    progress.finish("encode")
+
+    with progress.stage("request"):
+        response = get_transport().post(url, provider="google-vision", json=request_data)
+        return response.json()
+
+def load_images(uploaded_files):
+    """Read uploaded images, expanding zip archives, as (name, bytes) pairs"""
+    images = []
+    for uploaded in uploaded_files:
+        if uploaded.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(uploaded) as archive:
+                for info in archive.infolist():
+                    extension = info.filename.rsplit(".", 1)[-1].lower()
+                    if info.is_dir() or extension not in BATCH_IMAGE_TYPES:
+                        continue
+                    images.append((f"{uploaded.name}/{info.filename}", archive.read(info)))
+        else:
+            images.append((uploaded.name, uploaded.getvalue()))
+    return images
+
+def detect_objects_batch(images, limiter, max_workers=4, preprocess=True,
+                         max_side=MAX_UPLOAD_SIDE, quality=UPLOAD_JPEG_QUALITY,
+                         images_per_request=MAX_IMAGES_PER_REQUEST):
+    """
+    Detect objects in many images, yielding (name, response, error) per image
+    as each annotate call finishes.
+
+    Images are preprocessed and base64-encoded in parallel, then packed into
+    annotate calls of at most 16 images and MAX_REQUEST_BYTES of payload.
+    The calls run concurrently, each first taking a slot from the rate limiter.
+    """
+    transport = get_transport()
+    url = f"{VISION_URL}?key={API_KEY}"
+
+    def encode(item):
+        name, data = item
+        if preprocess:
+            data = preprocess_image(Image.open(io.BytesIO(data)), max_side, quality)
+        return base64.b64encode(data).decode('UTF-8')
+
+    def annotate(indices):
+        limiter.acquire()
+        response = transport.post(url, provider="google-vision", json={
+            "requests": [image_request(encoded[i]) for i in indices]
+        })
+        if response.status_code != 200:
+            raise Exception(f"Vision API returned {response.status_code}: {response.text[:200]}")
+        return response.json()["responses"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        encoded = {}
+        futures = {executor.submit(encode, item): i for i, item in enumerate(images)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                encoded[i] = future.result()
+            except Exception as e:
+                yield images[i][0], {}, f"Could not read image: {e}"
+
+        ready = sorted(encoded)
+        batches = [[ready[j] for j in batch] for batch in
+                   pack_batches([encoded[i] for i in ready], MAX_REQUEST_BYTES, images_per_request)]
+        futures = {executor.submit(annotate, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                responses = future.result()
+            except Exception as e:
+                for i in batch:
+                    yield images[i][0], {}, str(e)
+                continue
+            for i, response in zip(batch, responses):
+                yield images[i][0], response, response.get("error", {}).get("message", "")
+
+def label_counts(results):
+    """Aggregate table: objects found and images tagged per label"""
+    objects, tagged = Counter(), Counter()
+    for result in results:
+        objects.update(obj["name"] for obj in result["objects"])
+        tagged.update({label["description"] for label in result["labels"]})
+    names = sorted(set(objects) | set(tagged), key=lambda name: (-objects[name], -tagged[name], name))
+    return [{"label": name, "objects": objects[name], "images": tagged[name]} for name in names]
+
+def results_to_jsonl(results):
+    return "\n".join(json.dumps(result, ensure_ascii=False) for result in results) + "\n"
+
+def sample_frames(video_bytes, file_name, sample_fps=1.0):
+    """Decode a video with OpenCV and yield (seconds, RGB PIL image) at sample_fps"""
+    if cv2 is None:
+        raise RuntimeError("Video mode requires OpenCV; install opencv-python-headless")
+    suffix = os.path.splitext(file_name)[1] or ".mp4"
+    # OpenCV only reads videos from a path
+    with tempfile.NamedTemporaryFile(suffix=suffix) as video_file:
+        video_file.write(video_bytes)
+        video_file.flush()
+        capture = cv2.VideoCapture(video_file.name)
+        try:
+            native_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            step = max(int(round(native_fps / sample_fps)), 1)
+            index = 0
+            while True:
+                # grab() skips decoding frames that are not sampled
+                if not capture.grab():
+                    break
+                if index % step == 0:
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    yield index / native_fps, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                index += 1
+        finally:
+            capture.release()
+
+def detect_objects_video(video_bytes, file_name, limiter, sample_fps=1.0, hash_threshold=6,
+                         max_workers=4, max_side=MAX_UPLOAD_SIDE, quality=UPLOAD_JPEG_QUALITY):
+    """
+    Detect objects in a video, calling the API only when the scene changes.
+
+    Frames are sampled at sample_fps and hashed with dHash; a frame within
+    hash_threshold bits of the last submitted frame reuses that frame's
+    detections instead of being sent. The submitted frames go through
+    detect_objects_batch. Returns (timeline rows, clip frames, responses by
+    submitted frame index); clip frames are (timeline index, thumbnail)
+    pairs, at most MAX_CLIP_FRAMES of them evenly spread over the video.
+    """
+    timeline, clip_frames, submitted = [], [], []
+    clip_stride = 1
+    last_hash = None
+    for seconds, frame in sample_frames(video_bytes, file_name, sample_fps):
+        frame_hash = dhash(frame)
+        changed = last_hash is None or hamming_distance(frame_hash, last_hash) >= hash_threshold
+        if changed:
+            last_hash = frame_hash
+            submitted.append((str(len(submitted)), preprocess_image(frame, max_side, quality)))
+        timeline.append({"time_s": round(seconds, 2), "submitted": changed, "source_frame": len(submitted) - 1})
+        index = len(timeline) - 1
+        if index % clip_stride == 0:
+            preview = frame.copy()
+            preview.thumbnail((CLIP_FRAME_SIDE, CLIP_FRAME_SIDE))
+            clip_frames.append((index, preview))
+            # Over the cap: keep every other frame and sample half as often from now on
+            if len(clip_frames) > MAX_CLIP_FRAMES:
+                clip_frames = clip_frames[::2]
+                clip_stride *= 2
+
+    responses = {}
+    for name, response, error in detect_objects_batch(submitted, limiter, max_workers=max_workers, preprocess=False):
+        responses[int(name)] = {"responses": [response], "error": error}
+    return timeline, clip_frames, responses
+
+def annotated_clip(clip_frames, timeline, responses, sample_fps):
+    """Animated GIF of the clip frames with each frame's boxes drawn on it"""
+    frames = [
+        draw_bounding_boxes(frame, responses[timeline[index]["source_frame"]]).convert("P", palette=Image.ADAPTIVE)
+        for index, frame in clip_frames
+    ]
+    # Each clip frame stands for stride sampled frames
+    stride = clip_frames[1][0] - clip_frames[0][0] if len(clip_frames) > 1 else 1
+    output = io.BytesIO()
+    frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:],
+                   duration=int(1000 * stride / sample_fps), loop=0)
+    return output.getvalue()
+
+def detect_objects_tiled(image, limiter, tile_size=1024, overlap=0.2, iou_threshold=0.5,
+                         max_workers=8, quality=UPLOAD_JPEG_QUALITY):
+    """
+    Detect small objects in a large image by running detection on
+    overlapping tiles (plus one downscaled view of the whole image for
+    large objects) concurrently.
+
+    Tile-normalized vertices are mapped back to image coordinates and
+    duplicates from the overlaps are merged with per-label non-maximum
+    suppression. Returns a response shaped like a single annotate result,
+    with vertices normalized to the whole image, and merge statistics.
+    """
+    width, height = image.size
+    views = [(0, 0, width, height)] + tile_grid(width, height, tile_size, overlap)
+    image.load()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        encoded = executor.map(
+            lambda view: preprocess_image(image.crop(view), max(tile_size, MAX_UPLOAD_SIDE), quality), views
+        )
+        items = [(str(i), data) for i, data in enumerate(encoded)]
+    # Spread the views over all workers rather than filling 16-image calls
+    per_request = max(1, math.ceil(len(items) / max_workers))
+
+    boxes, scores, names, labels, errors = [], [], [], {}, []
+    for name, response, error in detect_objects_batch(items, limiter, max_workers=max_workers,
+                                                      preprocess=False, images_per_request=per_request):
+        if error:
+            errors.append(error)
+            continue
+        left, top, right, bottom = views[int(name)]
+        for obj in response.get("localizedObjectAnnotations", []):
+            # The API leaves out coordinates that are 0
+            xs = [left + v.get("x", 0.0) * (right - left) for v in obj["boundingPoly"]["normalizedVertices"]]
+            ys = [top + v.get("y", 0.0) * (bottom - top) for v in obj["boundingPoly"]["normalizedVertices"]]
+            boxes.append([min(xs), min(ys), max(xs), max(ys)])
+            scores.append(obj["score"])
+            names.append(obj["name"])
+        if name == "0":
+            labels = response.get("labelAnnotations", [])
+    if errors and len(errors) == len(views):
+        raise Exception(errors[0])
+
+    started = time.perf_counter()
+    kept = non_max_suppression(np.array(boxes).reshape(-1, 4), np.array(scores), iou_threshold, labels=names)
+    nms_seconds = time.perf_counter() - started
+
+    objects = []
+    for i in kept:
+        x1, y1, x2, y2 = boxes[i]
+        objects.append({
+            "name": names[i],
+            "score": scores[i],
+            "boundingPoly": {"normalizedVertices": [
+                {"x": x1 / width, "y": y1 / height}, {"x": x2 / width, "y": y1 / height},
+                {"x": x2 / width, "y": y2 / height}, {"x": x1 / width, "y": y2 / height},
+            ]},
+        })
+    stats = {
+        "tiles": len(views) - 1,
+        "failed_views": len(errors),
+        "candidate_boxes": len(boxes),
+        "merged_boxes": len(objects),
+        "nms_ms": round(nms_seconds * 1000, 2),
+    }
+    return {"responses": [{"localizedObjectAnnotations": objects, "labelAnnotations": labels}]}, stats
 
 def draw_bounding_boxes(image, vision_response):
     """
@@ -160,12 +454,8 @@ def draw_bounding_boxes(image, vision_response):
             vertices = obj['boundingPoly']['normalizedVertices']
             
             # Convert normalized vertices to actual pixel coordinates
-            box = [
-                (vertices[0]['x'] * width, vertices[0]['y'] * height),
-                (vertices[1]['x'] * width, vertices[1]['y'] * height),
-                (vertices[2]['x'] * width, vertices[2]['y'] * height),
-                (vertices[3]['x'] * width, vertices[3]['y'] * height)
-            ]
+            # (the API leaves out coordinates that are 0)
+            box = [(v.get('x', 0.0) * width, v.get('y', 0.0) * height) for v in vertices[:4]]
             
             # Draw bounding box
             draw.line([box[0], box[1], box[2], box[3], box[0]], fill=color, width=3)
@@ -226,6 +516,26 @@ def main():
             - Augmented reality applications
             </div>
         """, unsafe_allow_html=True)
+
+        st.header("Upload preprocessing")
+        preprocess = st.toggle("Downscale and re-encode before upload", value=True)
+        max_side = st.slider("Max image side (px)", min_value=512, max_value=4096,
+                             value=MAX_UPLOAD_SIDE, step=128, disabled=not preprocess)
+        jpeg_quality = st.slider("JPEG quality", min_value=50, max_value=95,
+                                 value=UPLOAD_JPEG_QUALITY, disabled=not preprocess)
+        compare_original = st.checkbox(
+            "Compare with original upload",
+            help="Also send the unprocessed image to measure its size and latency (one extra API call)",
+            disabled=not preprocess
+        )
+
+        st.header("Tiled detection")
+        tiled = st.toggle(
+            "Detect on overlapping tiles",
+            help="Finds small objects in large aerial or shelf images; one API view per tile"
+        )
+        tile_size = st.slider("Tile size (px)", min_value=256, max_value=2048, value=1024, step=128, disabled=not tiled)
+        tile_overlap = st.slider("Tile overlap", min_value=0.0, max_value=0.5, value=0.2, step=0.05, disabled=not tiled)
     
     # Main content area
     st.header("Image Upload")
@@ -235,7 +545,7 @@ def main():
     
     with col1:
         if uploaded_file is not None:
-            # Display original image
+            # Decoded once; used for display, preprocessing and drawing
             image = Image.open(uploaded_file)
             st.image(image, caption="Original Image", use_container_width=True)
     
@@ -243,22 +553,34 @@ def main():
     if uploaded_file is not None and st.button("Detect Objects"):
         # Display spinner during processing
         with st.spinner("Processing image..."):
-            # Read image bytes for API
-            image_bytes = uploaded_file.getvalue()
-            
-            # Create a progress bar
+            # Create a progress bar driven by the pipeline stages
             progress_bar = st.progress(0)
-            for i in range(100):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
+            progress = ProgressTracker(
+                DETECTION_STAGES,
+                on_update=lambda fraction, label: progress_bar.progress(fraction, text=label)
+            )
+
+            # Read image bytes for API
+            with progress.stage("upload"):
+                image_bytes = uploaded_file.getvalue()
             
             try:
-                # Call Google Vision API
-                vision_response = detect_objects_google_vision(image_bytes)
+                if tiled:
+                    with progress.stage("request"):
+                        vision_response, tile_stats = detect_objects_tiled(
+                            image, RateLimiter(int(st.secrets.get("VISION_RPM", 600))),
+                            tile_size=tile_size, overlap=tile_overlap, quality=jpeg_quality
+                        )
+                else:
+                    with progress.stage("preprocess"):
+                        upload_bytes = preprocess_image(image, max_side, jpeg_quality) if preprocess else image_bytes
+
+                    # Call Google Vision API
+                    vision_response = detect_objects_google_vision(upload_bytes, progress=progress)
                 
+                progress.start("render")
                 with col2:
-                    # Draw bounding boxes on image
-                    image = Image.open(uploaded_file)
+                    # Boxes are drawn on the original, full-resolution image
                     annotated_image = draw_bounding_boxes(image, vision_response)
                     st.image(annotated_image, caption="Detected Objects", use_container_width=True)
                 
@@ -289,10 +611,167 @@ def main():
                     st.error("No object detection results returned from the API.")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
+                progress.finish("render")
+
+                if tiled:
+                    tcol1, tcol2, tcol3 = st.columns(3)
+                    tcol1.metric("Tiles", tile_stats["tiles"])
+                    tcol2.metric("Boxes after merge", tile_stats["merged_boxes"],
+                                 delta=f"{tile_stats['candidate_boxes']} candidates", delta_color="off")
+                    tcol3.metric("Round trip", f"{stage_duration(progress, 'request'):.2f} s")
+                    st.caption(f"Box merge (NMS) took {tile_stats['nms_ms']} ms")
+                    if tile_stats["failed_views"]:
+                        st.warning(f"{tile_stats['failed_views']} views failed and were left out")
+                else:
+                    upload_rows = [{
+                        "upload": "preprocessed" if preprocess else "original",
+                        "dimensions": f"{image.width}x{image.height}" if not preprocess
+                                      else "x".join(map(str, Image.open(io.BytesIO(upload_bytes)).size)),
+                        "request body (KB)": round(base64_size(upload_bytes) / 1024, 1),
+                        "preprocess (s)": stage_duration(progress, "preprocess"),
+                        "encode (s)": stage_duration(progress, "encode"),
+                        "round trip (s)": stage_duration(progress, "request"),
+                    }]
+                    if preprocess and compare_original:
+                        baseline = ProgressTracker(DETECTION_STAGES)
+                        detect_objects_google_vision(image_bytes, progress=baseline)
+                        upload_rows.insert(0, {
+                            "upload": "original",
+                            "dimensions": f"{image.width}x{image.height}",
+                            "request body (KB)": round(base64_size(image_bytes) / 1024, 1),
+                            "preprocess (s)": 0.0,
+                            "encode (s)": stage_duration(baseline, "encode"),
+                            "round trip (s)": stage_duration(baseline, "request"),
+                        })
+
+                    mcol1, mcol2 = st.columns(2)
+                    mcol1.metric(
+                        "Request body",
+                        f"{base64_size(upload_bytes) / 1024:.0f} KB",
+                        delta=f"{(len(upload_bytes) / len(image_bytes) - 1) * 100:.0f}%" if preprocess else None,
+                        delta_color="inverse",
+                    )
+                    mcol2.metric("Round trip", f"{stage_duration(progress, 'request'):.2f} s")
+                    with st.expander("Upload size and latency"):
+                        st.table(upload_rows)
+
+                with st.expander("Stage timings"):
+                    st.table(progress.timings())
                 
             except Exception as e:
                 st.error(f"Error processing image: {str(e)}")
     
+    # Batch mode
+    st.markdown("---")
+    st.header("Batch Detection")
+    st.markdown("Detect objects in a folder of images uploaded as files or a zip archive")
+    batch_files = st.file_uploader(
+        "Upload images",
+        type=BATCH_IMAGE_TYPES + ["zip"],
+        accept_multiple_files=True,
+        key="batch_images"
+    )
+    bcol1, bcol2 = st.columns(2)
+    with bcol1:
+        batch_workers = st.number_input("Concurrent requests", min_value=1, max_value=16, value=4)
+    with bcol2:
+        batch_rpm = st.number_input(
+            "Requests per minute", min_value=1, value=int(st.secrets.get("VISION_RPM", 600))
+        )
+
+    batch_ran = False
+    if st.button("Detect Objects in Batch") and batch_files:
+        batch_ran = True
+        images = load_images(batch_files)
+        if not images:
+            st.warning("No jpg or png images were found in the upload")
+        else:
+            batch_progress = st.progress(0)
+            throughput = st.empty()
+            table = st.empty()
+
+            results = []
+            started = time.perf_counter()
+            for name, response, error in detect_objects_batch(
+                images, RateLimiter(batch_rpm), max_workers=batch_workers,
+                preprocess=preprocess, max_side=max_side, quality=jpeg_quality
+            ):
+                results.append({
+                    "file": name,
+                    "objects": [
+                        {"name": obj["name"], "score": round(obj["score"], 4),
+                         "vertices": obj["boundingPoly"]["normalizedVertices"]}
+                        for obj in response.get("localizedObjectAnnotations", [])
+                    ],
+                    "labels": [
+                        {"description": label["description"], "score": round(label["score"], 4)}
+                        for label in response.get("labelAnnotations", [])
+                    ],
+                    "error": error,
+                })
+                elapsed = time.perf_counter() - started
+                batch_progress.progress(len(results) / len(images), text=f"{len(results)}/{len(images)} images")
+                throughput.metric("Throughput", f"{len(results) / elapsed:.1f} images/s")
+                table.dataframe(label_counts(results), use_container_width=True)
+
+            # Keep the results so the download button survives the rerun it triggers
+            st.session_state.batch_detections = results
+
+    if st.session_state.get("batch_detections"):
+        results = st.session_state.batch_detections
+        if not batch_ran:
+            st.dataframe(label_counts(results), use_container_width=True)
+        failed = sum(1 for result in results if result["error"])
+        if failed:
+            st.warning(f"{failed} of {len(results)} images failed")
+        st.download_button("Download JSONL", results_to_jsonl(results),
+                           file_name="detections.jsonl", mime="application/jsonl")
+
+    # Video mode
+    st.markdown("---")
+    st.header("Video Detection")
+    st.markdown("Sample frames from a video and detect objects only when the scene changes")
+    video_file = st.file_uploader("Upload a video", type=VIDEO_TYPES, key="video_file")
+    vcol1, vcol2 = st.columns(2)
+    with vcol1:
+        sample_fps = st.slider("Sampled frames per second", min_value=0.5, max_value=10.0, value=1.0, step=0.5)
+    with vcol2:
+        hash_threshold = st.slider(
+            "Scene change threshold (bits)", min_value=0, max_value=32, value=6,
+            help="Frames whose 64-bit perceptual hash differs from the last submitted frame "
+                 "by fewer bits reuse its detections"
+        )
+
+    if video_file is not None and st.button("Detect Objects in Video"):
+        with st.spinner("Sampling frames and detecting objects..."):
+            try:
+                timeline, clip_frames, responses = detect_objects_video(
+                    video_file.getvalue(), video_file.name, RateLimiter(batch_rpm),
+                    sample_fps=sample_fps, hash_threshold=hash_threshold, max_workers=batch_workers,
+                    max_side=max_side, quality=jpeg_quality
+                )
+                if not timeline:
+                    st.warning("No frames could be decoded from the video")
+                else:
+                    submitted = len(responses)
+                    mcol1, mcol2, mcol3 = st.columns(3)
+                    mcol1.metric("Frames sampled", len(timeline))
+                    mcol2.metric("Frames sent to the API", submitted)
+                    mcol3.metric("Frames skipped", f"{(1 - submitted / len(timeline)) * 100:.0f}%")
+
+                    st.image(annotated_clip(clip_frames, timeline, responses, sample_fps),
+                             caption="Annotated clip")
+
+                    for row in timeline:
+                        detection = responses[row["source_frame"]]
+                        objects = detection["responses"][0].get("localizedObjectAnnotations", [])
+                        row["objects"] = ", ".join(sorted({obj["name"] for obj in objects}))
+                        row["error"] = detection["error"]
+                    st.subheader("Detections timeline")
+                    st.dataframe(timeline, use_container_width=True)
+            except Exception as e:
+                st.error(f"Error processing video: {str(e)}")
+
     # Display instructions when no image is uploaded
     if uploaded_file is None:
         st.info("""
@@ -301,6 +780,14 @@ def main():
             2. Click "Detect Objects" to analyze the image
             3. View the results with highlighted object bounding boxes
         """)
+
+    with st.expander("Connection pool"):
+        pool_stats = get_transport().stats()
+        if pool_stats:
+            st.dataframe([{"host": host, **host_stats} for host, host_stats in pool_stats.items()],
+                         use_container_width=True)
+        else:
+            st.caption("No connections opened yet")
     
     # Footer
     st.markdown("""
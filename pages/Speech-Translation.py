@@ -1,57 +1,380 @@
 import streamlit as st
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.async_client import get_async_client
+from utils.audio import SPEECH_SAMPLE_RATE, concat_audio, decode_audio, encode_wav, find_split_points
+from utils.cache import get_cache, make_key, normalize_text
+from utils.pipeline import Pipeline, Stage
+from utils.resilience import UNAVAILABLE_ERRORS
+from utils.speech import post_whisper, synthesize_speech
+from utils.text import pack_batches, split_segments
+from utils.transport import get_transport
 
 # Hardcoded API key - replace with your actual Google Translate API key
 API_KEY = st.secrets.get("Google_Translation_Key", "")
 
-def translate_text(text, target_language, source_language='auto'):
-    url = "https://translation.googleapis.com/language/translate/v2"
-    # Only include source if not auto-detect
+TRANSLATE_URL = "https://translation.googleapis.com/language/translate/v2"
+# Per-request limits: Google recommends at most 5K characters and 128 q values
+MAX_BATCH_CHARS = 5000
+MAX_BATCH_SEGMENTS = 128
+
+
+class TranslationError(Exception):
+    """The Translation API rejected a request"""
+
+
+# Failures of a single translation: an API rejection, an open circuit
+# breaker or a connection problem once retries are exhausted
+TRANSLATION_FAILURES = (TranslationError,) + UNAVAILABLE_ERRORS
+
+
+def _translate_batch(transport, segments, target_language, source_language):
+    """Translate one batch of segments in a single request, preserving order"""
     payload = {
-        'q': text,
+        'q': segments,
         'target': target_language,
-        'key': API_KEY
+        'format': 'text'
     }
     # Only add source parameter if not set to auto
     if source_language != 'auto':
         payload['source'] = source_language
-    
-    response = requests.post(url, params=payload)
-    if response.status_code == 200:
-        return response.json()['data']['translations'][0]['translatedText']
-    else:
-        return f"Error: {response.text}"
+
+    response = transport.post(TRANSLATE_URL, provider="google-translate",
+                              params={'key': API_KEY}, json=payload)
+    if response.status_code != 200:
+        raise TranslationError(response.text)
+    return [t['translatedText'] for t in response.json()['data']['translations']]
+
+
+def translate_segments(segments, target_language, source_language='auto', max_workers=4, transport=None):
+    """
+    Translate a list of segments, packing them into batches of many q values
+    that are sent concurrently. Returns the translations in input order.
+    """
+    transport = transport or get_transport()
+    batches = pack_batches(segments, MAX_BATCH_CHARS, MAX_BATCH_SEGMENTS)
+    translated = [None] * len(segments)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        results = executor.map(
+            lambda batch: _translate_batch(transport, [segments[i] for i in batch],
+                                           target_language, source_language),
+            batches,
+        )
+        for batch, batch_result in zip(batches, results):
+            for index, text in zip(batch, batch_result):
+                translated[index] = text
+    return translated
+
+
+def get_translation_memory():
+    """Segment-level translation memory shared by every session"""
+    return get_cache(
+        "translations",
+        max_mb=int(st.secrets.get("TRANSLATION_MEMORY_MB", 64)),
+        ttl=float(st.secrets.get("TRANSLATION_MEMORY_TTL_SECONDS", 30 * 24 * 3600)),
+    )
+
+
+def memory_key(segment, target_language, source_language):
+    return make_key("translation", normalize_text(segment), source_language, target_language)
+
+
+def translate_document(text, target_language, source_language='auto', max_workers=4,
+                       transport=None, memory=None):
+    """
+    Translate text of any length and return (translation, usage).
+
+    The text is split into sentences and lines. Segments already in the
+    translation memory are reused; only the misses are sent upstream, in
+    concurrent batches, and stored for next time. The result is stitched
+    back together with the original whitespace and line breaks. usage
+    counts segment hits/misses and the characters sent vs. saved.
+    """
+    memory = memory or get_translation_memory()
+    segments, separators = split_segments(text)
+    usage = {"segments": 0, "hits": 0, "misses": 0, "chars_sent": 0, "chars_saved": 0}
+
+    misses = {}
+    for index, segment in enumerate(segments):
+        core = segment.strip()
+        if not core:
+            continue
+        usage["segments"] += 1
+        cached = memory.get_text(memory_key(core, target_language, source_language))
+        if cached is not None:
+            segments[index] = segment.replace(core, cached, 1)
+            usage["hits"] += 1
+            usage["chars_saved"] += len(core)
+        else:
+            # Identical segments in one document are translated once
+            misses.setdefault(core, []).append(index)
+
+    if misses:
+        pending = list(misses)
+        translated = translate_segments(pending, target_language, source_language, max_workers, transport)
+        for core, translation in zip(pending, translated):
+            memory.set_text(memory_key(core, target_language, source_language), translation)
+            for index in misses[core]:
+                segments[index] = segments[index].replace(core, translation, 1)
+            usage["misses"] += len(misses[core])
+            usage["chars_sent"] += len(core)
+            usage["chars_saved"] += len(core) * (len(misses[core]) - 1)
+
+    translation = "".join(segment + separator for segment, separator in zip(segments, separators))
+    return translation, usage
+
+
+# Characters of input sent to /detect; the language is clear well before this
+DETECT_SAMPLE_CHARS = 1000
+
+
+def detect_language(text, transport=None):
+    """Detect the language of text once with the v2 /detect endpoint"""
+    transport = transport or get_transport()
+    response = transport.post(TRANSLATE_URL + "/detect", provider="google-translate",
+                              params={'key': API_KEY}, json={'q': [text[:DETECT_SAMPLE_CHARS]]})
+    if response.status_code != 200:
+        raise TranslationError(response.text)
+    return response.json()['data']['detections'][0][0]['language']
+
+
+def translate_many(text, target_languages, source_language='auto', max_workers=4):
+    """
+    Translate text into several languages concurrently, yielding
+    (target, translation, usage) as each one finishes.
+
+    The source language is detected once up front (when 'auto') and reused
+    for every target, which also lets the translation memory key on it.
+    Targets run on a bounded pool sharing the pooled transport; a failed
+    target yields (target, "Error: ...", None) and the others carry on.
+    """
+    transport = get_transport()
+    memory = get_translation_memory()
+    if source_language == 'auto':
+        source_language = detect_language(text, transport)
+
+    def run(target):
+        if target == source_language:
+            return text, {"segments": 0, "hits": 0, "misses": 0, "chars_sent": 0, "chars_saved": 0}
+        # Each target's own batches share a small slice of the concurrency
+        return translate_document(text, target, source_language, max_workers=2,
+                                  transport=transport, memory=memory)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(target_languages)))) as executor:
+        futures = {executor.submit(run, target): target for target in target_languages}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                translation, usage = future.result()
+            except TRANSLATION_FAILURES as e:
+                yield target, f"Error: {e}", None
+            else:
+                yield target, translation, usage
+
+
+# Speech is cut at pauses into segments of at most this many seconds;
+# short segments let the first translated audio come back sooner
+PIPELINE_SEGMENT_SECONDS = 20
+# Segments allowed to wait between two pipeline stages
+PIPELINE_QUEUE_SIZE = 2
+
+
+def speech_segments(audio_bytes, file_name):
+    """Decode a recording and yield it as short 16 kHz WAV segments cut at pauses"""
+    samples, _ = decode_audio(audio_bytes, file_name, target_rate=SPEECH_SAMPLE_RATE)
+    cuts = find_split_points(samples, SPEECH_SAMPLE_RATE, PIPELINE_SEGMENT_SECONDS, search_seconds=5)
+    for start, end in zip(cuts, cuts[1:]):
+        yield encode_wav(samples[start:end], SPEECH_SAMPLE_RATE)
+
+
+def build_speech_pipeline(target_language, source_language='auto', voice="alloy"):
+    """
+    Speech-to-speech translation as three overlapping stages: Whisper
+    transcription -> translation -> TTS. Each stage hands its segment to the
+    next through a bounded queue, so one segment is being synthesized while
+    the next is being transcribed. Items of the result are dicts with the
+    segment's text, translation and mp3 audio.
+    """
+    transport = get_transport()
+    memory = get_translation_memory()
+    client = get_async_client()
+
+    def transcribe(segment):
+        return post_whisper(transport, segment, "segment.wav", "audio/wav").get("text", "").strip()
+
+    def translate(text):
+        if not text:
+            return text, ""
+        translation, _ = translate_document(text, target_language, source_language, max_workers=1,
+                                           transport=transport, memory=memory)
+        return text, translation
+
+    def synthesize(texts):
+        text, translation = texts
+        audio = synthesize_speech(client, translation, voice, "mp3") if translation else b""
+        return {"text": text, "translation": translation, "audio": audio}
+
+    return Pipeline(
+        [Stage("transcribe", transcribe), Stage("translate", translate), Stage("synthesize", synthesize)],
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+
+
+def speech_translation(languages):
+    """Speech input mode: translate a recording into speech in another language"""
+    audio_file = st.file_uploader("Speech to translate:", type=["wav", "mp3", "m4a"])
+    source_lang = st.selectbox("Spoken Language (or auto-detect):", ['Auto-detect'] + list(languages.keys()))
+    target_lang = st.selectbox("Target Language:", list(languages.keys()))
+    voice = st.selectbox("Voice:", ["alloy", "echo", "fable", "onyx", "nova", "shimmer"])
+
+    if not st.button("Translate speech"):
+        return
+    if audio_file is None:
+        st.warning("Please upload a recording to translate")
+        return
+
+    source_code = 'auto' if source_lang == 'Auto-detect' else languages[source_lang]
+    pipeline = build_speech_pipeline(languages[target_lang], source_code, voice)
+    status = st.empty()
+    segments_container = st.container()
+    parts = []
+    try:
+        for index, result in pipeline.run(speech_segments(audio_file.getvalue(), audio_file.name)):
+            with segments_container:
+                st.write(f"**Segment {index + 1}:** {result['translation']}")
+                st.caption(result["text"])
+                if result["audio"]:
+                    st.audio(result["audio"], format="audio/mp3", autoplay=not parts)
+            if result["audio"]:
+                parts.append(result["audio"])
+            if index == 0:
+                status.caption(f"First segment ready after {pipeline.elapsed():.1f}s")
+    except Exception as e:
+        st.error(f"Speech translation failed: {str(e)}")
+        return
+
+    if parts:
+        audio_bytes = concat_audio(parts, "mp3")
+        st.write("### Translated Speech:")
+        st.audio(audio_bytes, format="audio/mp3")
+        st.download_button("Download Audio", data=audio_bytes,
+                           file_name=f"translation_{languages[target_lang]}.mp3", mime="audio/mp3")
+
+    stats = pipeline.stats()
+    busy = sum(row["busy_s"] for row in stats)
+    slowest = max(row["busy_s"] for row in stats)
+    status.caption(
+        f"End to end {pipeline.elapsed():.1f}s • sum of stages {busy:.1f}s • slowest stage {slowest:.1f}s"
+    )
+    with st.expander("Pipeline stages"):
+        st.dataframe(stats, use_container_width=True)
+
 
 def main():
     st.title("Real-Time Language Translator")
-    
-    input_text = st.text_area("Input text:", height=150)
-    
+
     languages = {
         'English': 'en', 'Spanish': 'es', 'French': 'fr', 'German': 'de',
         'Italian': 'it', 'Portuguese': 'pt', 'Russian': 'ru', 'Japanese': 'ja',
         'Korean': 'ko', 'Chinese (Simplified)': 'zh', 'Arabic': 'ar'
     }
+
+    input_mode = st.radio("Input:", ["Text", "Speech"], horizontal=True)
+    if input_mode == "Speech":
+        speech_translation(languages)
+        return
+
+    input_text = st.text_area("Input text:", height=150)
     
     source_lang = st.selectbox("Source Language (or auto-detect):", ['Auto-detect'] + list(languages.keys()))
-    target_lang = st.selectbox("Target Language:", list(languages.keys()))
-    
+    multi_target = st.toggle("Translate into multiple languages")
+    if multi_target:
+        target_langs = st.multiselect("Target Languages:", list(languages.keys()), default=['Spanish', 'French', 'German'])
+        max_parallel = st.slider("Parallel translations", min_value=1, max_value=len(languages), value=4)
+    else:
+        target_lang = st.selectbox("Target Language:", list(languages.keys()))
+
     if st.button("Translate"):
+        source_code = 'auto' if source_lang == 'Auto-detect' else languages[source_lang]
         if not input_text:
             st.warning("Please enter text to translate")
+        elif multi_target:
+            if not target_langs:
+                st.warning("Please select at least one target language")
+                return
+            # Side-by-side grid with a slot per language, filled as results arrive
+            grid = st.columns(min(len(target_langs), 3))
+            slots = {}
+            for i, name in enumerate(target_langs):
+                with grid[i % len(grid)]:
+                    st.write(f"**{name}**")
+                    slots[languages[name]] = st.empty()
+                    slots[languages[name]].caption("Translating...")
+
+            usage_total = {"chars_sent": 0, "chars_saved": 0}
+            try:
+                for target, translation, usage in translate_many(
+                    input_text, [languages[name] for name in target_langs], source_code, max_parallel
+                ):
+                    if usage is None:
+                        slots[target].error(translation)
+                        continue
+                    slots[target].text(translation)
+                    usage_total["chars_sent"] += usage["chars_sent"]
+                    usage_total["chars_saved"] += usage["chars_saved"]
+            except TRANSLATION_FAILURES as e:
+                st.error(f"Language detection failed: {e}")
+                return
+            st.caption(
+                f"{len(target_langs)} languages • {usage_total['chars_sent']:,} characters billed • "
+                f"{usage_total['chars_saved']:,} characters saved"
+            )
+            totals = st.session_state.setdefault("translation_usage", {"chars_sent": 0, "chars_saved": 0})
+            totals["chars_sent"] += usage_total["chars_sent"]
+            totals["chars_saved"] += usage_total["chars_saved"]
         else:
             with st.spinner("Translating..."):
-                source_code = 'auto' if source_lang == 'Auto-detect' else languages[source_lang]
-                translated_text = translate_text(
-                    input_text,
-                    target_language=languages[target_lang],
-                    source_language=source_code
-                )
-                
+                try:
+                    translated_text, usage = translate_document(
+                        input_text,
+                        target_language=languages[target_lang],
+                        source_language=source_code
+                    )
+                except TRANSLATION_FAILURES as e:
+                    st.error(f"Error: {e}")
+                    return
+
                 st.success("Translation Complete!")
                 st.write("### Translated Text:")
-                st.write(translated_text)
+                st.text(translated_text)
+
+                hit_ratio = usage["hits"] / usage["segments"] if usage["segments"] else 0.0
+                st.caption(
+                    f"Translation memory: {usage['hits']}/{usage['segments']} segments reused "
+                    f"({hit_ratio * 100:.0f}%) • {usage['chars_sent']:,} characters billed • "
+                    f"{usage['chars_saved']:,} characters saved"
+                )
+                totals = st.session_state.setdefault("translation_usage", {"chars_sent": 0, "chars_saved": 0})
+                totals["chars_sent"] += usage["chars_sent"]
+                totals["chars_saved"] += usage["chars_saved"]
+
+    with st.expander("Translation memory"):
+        memory_stats = get_translation_memory().stats()
+        totals = st.session_state.get("translation_usage", {"chars_sent": 0, "chars_saved": 0})
+        st.metric("Segment hit rate", f"{memory_stats['hit_rate'] * 100:.0f}%")
+        st.caption(
+            f"This session: {totals['chars_sent']:,} characters billed • {totals['chars_saved']:,} saved • "
+            f"{memory_stats['entries']} segments stored ({memory_stats['bytes_stored'] / 1024:.1f} KB)"
+        )
+
+    with st.expander("Connection pool"):
+        pool_stats = get_transport().stats()
+        if pool_stats:
+            st.dataframe([{"host": host, **host_stats} for host, host_stats in pool_stats.items()],
+                         use_container_width=True)
+        else:
+            st.caption("No connections opened yet")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,14 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
-import requests
+
+from utils.audio import SPEECH_SAMPLE_RATE, decode_audio, encode_speech, encode_wav, find_split_points
+from utils.cache import get_cache, make_key
+from utils.resilience import UNAVAILABLE_ERRORS
+from utils.singleflight import get_singleflight
+from utils.speech import TranscriptionError, post_whisper
+from utils.transport import get_transport
 
 # Streamlit Page Config
 st.set_page_config(
@@ -34,32 +43,214 @@ with st.sidebar:
 api_url = st.secrets["api_url"]
 api_key = st.secrets["api_key"]
 
+# Whisper rejects uploads over 25 MB
+WHISPER_MAX_BYTES = 25 * 1024 * 1024
+
+# Long recordings are cut into segments of at most this length (shorter
+# segments mean more of them run in parallel) with a little overlap so
+# words at the cut are heard in full by one side
+LONG_AUDIO_SEGMENT_SECONDS = 300
+SEGMENT_OVERLAP_SECONDS = 1.0
+
+def _normalize_word(word):
+    return "".join(ch for ch in word.lower() if ch.isalnum())
+
+
+def drop_repeated_prefix(previous_text, text, max_words=30):
+    """Remove words at the start of text that repeat the end of previous_text"""
+    previous = [_normalize_word(w) for w in previous_text.split()[-max_words:]]
+    words = text.split()
+    current = [_normalize_word(w) for w in words[:max_words]]
+    for size in range(min(len(previous), len(current)), 0, -1):
+        if previous[-size:] == current[:size]:
+            return " ".join(words[size:])
+    return text
+
+
+def prepare_upload(audio_bytes, file_name, mime_type, compress=False):
+    """
+    Optionally downmix to mono 16 kHz and compress before upload.
+
+    Returns (data, file name, mime type); the original is passed through
+    untouched when compression is off or would not make it smaller.
+    """
+    if not compress:
+        return audio_bytes, file_name, mime_type
+    samples, _ = decode_audio(audio_bytes, file_name, target_rate=SPEECH_SAMPLE_RATE)
+    data, extension, compressed_mime = encode_speech(samples, SPEECH_SAMPLE_RATE)
+    if len(data) >= len(audio_bytes):
+        return audio_bytes, file_name, mime_type
+    return data, f"{file_name.rsplit('.', 1)[0]}.{extension}", compressed_mime
+
+
+def transcribe_long(audio_bytes, file_name, max_workers=4, compress=False):
+    """
+    Transcribe a recording of any length.
+
+    The audio is decoded locally, resampled to 16 kHz mono and cut at the
+    quietest points into segments under the upload limit, with a small
+    overlap on each side. The segments are transcribed concurrently and
+    stitched back together: Whisper's segment timestamps are shifted by
+    each segment's offset, and a segment heard twice in an overlap is kept
+    only by the piece whose core span contains its midpoint.
+    """
+    # Whisper works at 16 kHz anyway; uploading more only shrinks the segments
+    samples, sample_rate = decode_audio(audio_bytes, file_name, target_rate=SPEECH_SAMPLE_RATE)
+
+    # Size segments as 16-bit mono WAV (the worst case); leave headroom for the overlaps
+    max_seconds = min(
+        LONG_AUDIO_SEGMENT_SECONDS,
+        WHISPER_MAX_BYTES * 0.95 / (sample_rate * 2) - 2 * SEGMENT_OVERLAP_SECONDS,
+    )
+    cuts = find_split_points(samples, sample_rate, max_seconds)
+    overlap = int(SEGMENT_OVERLAP_SECONDS * sample_rate)
+
+    pieces = []
+    for i in range(len(cuts) - 1):
+        start = max(cuts[i] - overlap, 0)
+        end = min(cuts[i + 1] + overlap, len(samples))
+        if compress:
+            data, extension, mime = encode_speech(samples[start:end], sample_rate)
+        else:
+            data, extension, mime = encode_wav(samples[start:end], sample_rate), "wav", "audio/wav"
+        pieces.append({
+            "core": (cuts[i] / sample_rate, cuts[i + 1] / sample_rate),
+            "offset": start / sample_rate,
+            "audio": data,
+            "file_name": f"segment.{extension}",
+            "mime": mime,
+        })
+
+    transport = get_transport()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(
+            lambda piece: post_whisper(transport, piece["audio"], piece["file_name"], piece["mime"], verbose=True),
+            pieces,
+        ))
+
+    segments = []
+    for piece, result in zip(pieces, responses):
+        core_start, core_end = piece["core"]
+        if result.get("segments"):
+            for segment in result["segments"]:
+                start = segment["start"] + piece["offset"]
+                end = segment["end"] + piece["offset"]
+                if core_start <= (start + end) / 2 < core_end:
+                    segments.append({"start": round(start, 2), "end": round(end, 2), "text": segment["text"].strip()})
+        else:
+            # No timestamps to go by; trim words repeated from the previous piece
+            text = result.get("text", "").strip()
+            if segments:
+                text = drop_repeated_prefix(segments[-1]["text"], text)
+            segments.append({"start": round(core_start, 2), "end": round(core_end, 2), "text": text})
+
+    return {
+        "text": " ".join(segment["text"] for segment in segments if segment["text"]),
+        "segments": segments,
+        "duration": round(len(samples) / sample_rate, 2),
+        "upload": {
+            "original_bytes": len(audio_bytes),
+            "sent_bytes": sum(len(piece["audio"]) for piece in pieces),
+        },
+    }
+
+
+def transcribe(audio_bytes, file_name, mime_type, long_audio=False, max_workers=4, compress=False):
+    """
+    Transcribe audio with Whisper, at most once per distinct file.
+
+    Results are keyed by a hash of the audio content and stored in the shared
+    cache, so Streamlit reruns and other sessions uploading the same file get
+    the stored transcript. A transcription already in flight for the same
+    content is joined instead of being submitted again.
+    """
+    key = make_key(hashlib.sha256(audio_bytes).hexdigest(), api_url, long_audio, compress)
+    cache = get_cache("transcriptions")
+    result = cache.get_json(key)
+    if result is not None:
+        return result
+
+    def run():
+        # Another session may have finished while this one was waiting
+        stored = cache.get_json(key)
+        if stored is not None:
+            return stored
+
+        if long_audio:
+            transcript = transcribe_long(audio_bytes, file_name, max_workers=max_workers, compress=compress)
+        else:
+            data, upload_name, upload_mime = prepare_upload(audio_bytes, file_name, mime_type, compress)
+            transcript = post_whisper(get_transport(), data, upload_name, upload_mime)
+            transcript["upload"] = {"original_bytes": len(audio_bytes), "sent_bytes": len(data)}
+        cache.set_json(key, transcript)
+        return transcript
+
+    return get_singleflight("transcriptions").do(key, run)
+
+
 # Upload audio file
 uploaded_file = st.file_uploader("🎧 Upload an audio file (e.g., .mp3, .wav, .m4a)", type=["mp3", "wav", "m4a"])
 
+long_audio = st.toggle(
+    "Long-audio mode",
+    value=False,
+    help="Split long recordings at pauses and transcribe the parts in parallel. "
+         "Used automatically for files over 25 MB."
+)
+parallel_segments = st.slider("Parallel segments", min_value=1, max_value=16, value=4, disabled=not long_audio)
+compress_upload = st.toggle(
+    "Compress before upload",
+    value=False,
+    help="Downmix to mono 16 kHz and encode as Opus (WAV when ffmpeg is unavailable) before sending"
+)
+
 if uploaded_file and api_key and api_url:
     st.write("### 🎵 Uploaded Audio Preview:")
     st.audio(uploaded_file, format="audio/wav")
     
     # Sending file to API
     with st.spinner("⏳ Transcribing audio... Please wait."):
-        # API headers
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "api-key": api_key,
-        }
-        
-        # Uploading the file to the API as a form-data POST request
-        files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-
-        response = requests.post(api_url, headers=headers, files=files)
-
-        # Display result
-        if response.status_code == 200:
-            result = response.json()
+        try:
+            result = transcribe(
+                uploaded_file.getvalue(),
+                uploaded_file.name,
+                uploaded_file.type,
+                long_audio=long_audio or uploaded_file.size > WHISPER_MAX_BYTES,
+                max_workers=parallel_segments,
+                compress=compress_upload,
+            )
+        except TranscriptionError as e:
+            st.error(f"❌ Failed to transcribe. Status Code: {e.status_code}")
+            st.write("**Error Details:**", e.details)
+        except RuntimeError as e:
+            st.error(f"❌ {e}")
+        except UNAVAILABLE_ERRORS as e:
+            st.error(f"❌ Transcription service unavailable: {e}")
+        else:
+            # Display result
             st.success("✅ Transcription completed successfully!")
             st.write("### 📝 Transcribed Text:")
             st.text_area("Transcription Output", result.get("text", "No transcription available"), height=200)
-        else:
-            st.error(f"❌ Failed to transcribe. Status Code: {response.status_code}")
-            st.write("**Error Details:**", response.text)
\ No newline at end of file
+
+            upload = result.get("upload")
+            if upload:
+                ucol1, ucol2 = st.columns(2)
+                ucol1.metric("Original size", f"{upload['original_bytes'] / 1024:.0f} KB")
+                ucol2.metric(
+                    "Bytes on the wire",
+                    f"{upload['sent_bytes'] / 1024:.0f} KB",
+                    delta=f"{(upload['sent_bytes'] / upload['original_bytes'] - 1) * 100:.0f}%",
+                    delta_color="inverse",
+                )
+
+            if result.get("segments"):
+                with st.expander("🕒 Timestamps"):
+                    st.dataframe(result["segments"], use_container_width=True)
+
+with st.expander("Connection pool"):
+    pool_stats = get_transport().stats()
+    if pool_stats:
+        st.dataframe([{"host": host, **host_stats} for host, host_stats in pool_stats.items()],
+                     use_container_width=True)
+    else:
+        st.caption("No connections opened yet")
@@ -1,21 +1,73 @@
 import streamlit as st
 import time
-import requests
+import io
+import csv
 import json
 import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.cache import get_cache, make_key, normalize_text
+from utils.progress import ProgressTracker
+from utils.ratelimit import RateLimiter
+from utils.text import chunk_text
+from utils.tokens import count_tokens
+from utils.async_client import get_async_client
+
+# Documents larger than this are summarized chunk by chunk (map-reduce)
+CHUNK_TOKENS = 3000
+
+# Relative weight of each pipeline stage on the progress bar
+SINGLE_PASS_STAGES = {"encode": 5, "request": 85, "render": 10}
+CHUNKED_STAGES = {"encode": 5, "chunks": 70, "reduce": 20, "render": 5}
+
+# Bump whenever the summarization prompts change so stale summaries are not served
+PROMPT_VERSION = 2
+
+def estimate_reduce_calls(tokens, chunk_tokens):
+    """Chunk calls needed before partial summaries of this many tokens fit in one chunk"""
+    calls = 0
+    while tokens > chunk_tokens:
+        count = -(-tokens // chunk_tokens)
+        calls += count
+        # Each chunk summary is capped at a quarter of a chunk
+        tokens = count * (chunk_tokens // 4)
+    return calls
 
 class AzureOpenAISummarizer:
-    def __init__(self):
+    length_map = {
+        "Very Brief": {
+            "description": "1 paragraph (3-4 sentences)",
+            "target_reduction": 85
+        },
+        "Brief": {
+            "description": "1-2 paragraphs",
+            "target_reduction": 75
+        },
+        "Moderate": {
+            "description": "2-3 paragraphs",
+            "target_reduction": 60
+        },
+        "Detailed": {
+            "description": "3-4 paragraphs",
+            "target_reduction": 50
+        }
+    }
+
+    def __init__(self, limiter=None, max_in_flight=None):
         # Get the API endpoint and key from Streamlit secrets - exactly like your chat app
         self.API_ENDPOINT = st.secrets.get("AZURE_OPENAI_API_ENDPOINT", "")
         self.API_KEY = st.secrets.get("AZURE_OPENAI_API_KEY", "")
+        # Resolved here so worker threads never touch the Streamlit cache
+        self.client = get_async_client()
+        # Optional RateLimiter charged for every request, and a cap on the
+        # requests in flight across all threads using this summarizer
+        self.limiter = limiter
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
     
-    def generate_response(self, query, max_tokens=1000, max_retries=3):
-        """Generate response from Azure OpenAI with retry logic"""
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.API_KEY,
-        }
+    def generate_response(self, query, max_tokens=1000):
+        """Generate response from Azure OpenAI (retries follow the shared azure-openai policy)"""
         data = {
             "messages": [{"role": "user", "content": query}],
             "max_tokens": max_tokens,
@@ -25,51 +77,44 @@ class AzureOpenAISummarizer:
             "presence_penalty": 0,
         }
         
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    self.API_ENDPOINT, 
-                    headers=headers, 
-                    json=data,
-                    timeout=60  # Increase timeout to 60 seconds
-                )
-                response.raise_for_status()
-                return response.json()
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                if attempt < max_retries - 1:
-                    # Wait with exponential backoff before retrying
-                    time.sleep(2 ** attempt)
-                    continue
-                else:
-                    raise Exception(f"Failed after {max_retries} attempts: {str(e)}")
-    
-    def summarize_text(self, text, length_option, audience, target_reduction=None):
-        # Create the prompt for summarization with improved reduction guidance
-        length_map = {
-            "Very Brief": {
-                "description": "1 paragraph (3-4 sentences)",
-                "target_reduction": 85
-            },
-            "Brief": {
-                "description": "1-2 paragraphs",
-                "target_reduction": 75
-            },
-            "Moderate": {
-                "description": "2-3 paragraphs",
-                "target_reduction": 60
-            },
-            "Detailed": {
-                "description": "3-4 paragraphs",
-                "target_reduction": 50
-            }
-        }
-        
+        return self.client.run(
+            self.client.chat_completion(self.API_ENDPOINT, self.API_KEY, data)
+        )
+
+    def _complete(self, prompt, max_tokens=1000):
+        if self._slots:
+            with self._slots:
+                return self._complete_now(prompt, max_tokens)
+        return self._complete_now(prompt, max_tokens)
+
+    def _complete_now(self, prompt, max_tokens):
+        if self.limiter:
+            # The prompt plus the largest completion the request may produce
+            self.limiter.acquire(count_tokens(prompt) + max_tokens)
+        response = self.generate_response(prompt, max_tokens=max_tokens)
+
+        # Extract the summary from the response
+        if response and "choices" in response:
+            return response["choices"][0]["message"]["content"]
+        raise Exception("Failed to generate a summary")
+
+    def _build_prompt(self, text, length_option, audience, target_reduction=None, original_words=None):
         # Use custom target reduction if provided, otherwise use default
-        reduction_target = target_reduction if target_reduction else length_map[length_option]["target_reduction"]
-        
+        reduction_target = target_reduction if target_reduction else self.length_map[length_option]["target_reduction"]
+
+        # When reducing partial summaries, the target is relative to the original document
+        if original_words:
+            target_words = max(int(original_words * (100 - reduction_target) / 100), 50)
+            source_note = (
+                f"The text below is a sequence of summaries of consecutive sections of a {original_words}-word document.\n"
+                f"        Your summary should be approximately {reduction_target}% shorter than that original document (about {target_words} words)."
+            )
+        else:
+            source_note = f"Your summary should be approximately {reduction_target}% shorter than the original text."
+
         # Build the summarization prompt with specific reduction targets
-        prompt = f"""You are an expert summarizer. Create a highly concise {length_map[length_option]["description"]} summary of the following text.
-        Your summary should be approximately {reduction_target}% shorter than the original text.
+        return f"""You are an expert summarizer. Create a highly concise {self.length_map[length_option]["description"]} summary of the following text.
+        {source_note}
         Target the summary for a {audience.lower()} audience.
         Focus ONLY on the most essential ideas and key findings.
         Eliminate all redundancy and unnecessary details.
@@ -79,16 +124,173 @@ class AzureOpenAISummarizer:
         Here is the text to summarize:
         {text}
         """
+
+    def summarize_text(self, text, length_option, audience, target_reduction=None, progress=None):
+        progress = progress or ProgressTracker(SINGLE_PASS_STAGES)
+
+        # Create the prompt for summarization with improved reduction guidance
+        with progress.stage("encode"):
+            prompt = self._build_prompt(text, length_option, audience, target_reduction)
         
         # Use the same method as your chat app to get a response
-        response = self.generate_response(prompt)
+        with progress.stage("request"):
+            return self._complete(prompt)
+
+    def _summarize_chunk(self, chunk, audience, max_tokens=CHUNK_TOKENS // 4):
+        prompt = f"""You are summarizing one section of a longer document for a {audience.lower()} audience.
+        Write a dense summary of this section that keeps every key idea, finding, figure and name.
+        Do not add an introduction or conclusion; the summary will be merged with summaries of the other sections.
         
-        # Extract the summary from the response
-        if response and "choices" in response:
-            summary = response["choices"][0]["message"]["content"]
-            return summary
+        Here is the section:
+        {chunk}
+        """
+        return self._complete(prompt, max_tokens=max_tokens)
+
+    def summarize_text_chunked(self, text, length_option, audience, target_reduction=None,
+                               chunk_tokens=CHUNK_TOKENS, max_workers=4, progress=None):
+        """
+        Map-reduce summarization for documents that do not fit one prompt.
+
+        The text is split on paragraph and sentence boundaries, the chunks are
+        summarized concurrently, and the partial summaries are reduced into the
+        final summary, recursing while they are still larger than one chunk.
+
+        Progress events are emitted from the calling thread only.
+        """
+        progress = progress or ProgressTracker(CHUNKED_STAGES)
+
+        with progress.stage("encode"):
+            chunks = chunk_text(text, chunk_tokens)
+        if len(chunks) <= 1:
+            # The document fits in a single prompt after all; that prompt
+            # stands in for the chunk and reduce stages on the progress bar
+            progress.finish("chunks")
+            with progress.stage("reduce"):
+                return self.summarize_text(text, length_option, audience, target_reduction, progress=progress)
+
+        original_words = len(text.split())
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def summarize_pieces(pieces, stage, done, total):
+                futures = {executor.submit(self._summarize_chunk, c, audience, chunk_tokens // 4): i for i, c in enumerate(pieces)}
+                partials = [None] * len(pieces)
+                for future in as_completed(futures):
+                    partials[futures[future]] = future.result()
+                    done += 1
+                    progress.advance(stage, done, total)
+                return "\n\n".join(partials), done
+
+            # Map: one call per chunk of the document
+            combined, _ = summarize_pieces(chunks, "chunks", 0, len(chunks))
+            progress.finish("chunks")
+
+            # Reduce: partial summaries still larger than one chunk are
+            # summarized again before the final call. Its progress is counted
+            # against an up-front estimate of those calls, so the bar keeps
+            # moving forward through every pass.
+            with progress.stage("reduce"):
+                done, total = 0, 0
+                while True:
+                    total = max(total, done + estimate_reduce_calls(count_tokens(combined), chunk_tokens) + 1)
+                    if count_tokens(combined) <= chunk_tokens:
+                        break
+                    combined, done = summarize_pieces(chunk_text(combined, chunk_tokens), "reduce", done, total)
+                prompt = self._build_prompt(combined, length_option, audience, target_reduction, original_words)
+                return self._complete(prompt)
+
+    def cache_key(self, text, length_option, audience, target_reduction=None):
+        """Content-addressed key for a summary of text with the given settings"""
+        # The endpoint URL names the model deployment
+        return make_key(
+            normalize_text(text), length_option, audience, target_reduction,
+            self.API_ENDPOINT, PROMPT_VERSION
+        )
+
+
+def get_summary_cache():
+    return get_cache(
+        "summaries",
+        max_mb=int(st.secrets.get("SUMMARY_CACHE_MB", 256)),
+        ttl=float(st.secrets.get("SUMMARY_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    )
+
+
+BATCH_FILE_TYPES = ["txt", "md", "csv", "json", "html"]
+
+
+def load_documents(uploaded_files):
+    """Read uploaded text files, expanding zip archives, as (name, text) pairs"""
+    documents = []
+    for uploaded in uploaded_files:
+        if uploaded.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(uploaded) as archive:
+                for info in archive.infolist():
+                    extension = info.filename.rsplit(".", 1)[-1].lower()
+                    if info.is_dir() or extension not in BATCH_FILE_TYPES:
+                        continue
+                    text = archive.read(info).decode("utf-8", errors="replace")
+                    documents.append((f"{uploaded.name}/{info.filename}", text))
         else:
-            raise Exception("Failed to generate a summary")
+            documents.append((uploaded.name, uploaded.getvalue().decode("utf-8", errors="replace")))
+    return [(name, text) for name, text in documents if text.strip()]
+
+
+def summarize_batch(documents, summarizer, summary_cache, length_option, audience,
+                    target_reduction, max_workers=4, chunked=True):
+    """
+    Summarize many documents concurrently, yielding result rows as they finish.
+
+    Every API call, including each chunk and reduce call of a chunked
+    summary, goes through the summarizer's rate limiter and request slots,
+    so the batch stays within the deployment's requests-per-minute and
+    tokens-per-minute quota and never has more than max_in_flight requests
+    open at once.
+    """
+    def summarize_one(name, text):
+        started = time.perf_counter()
+        key = summarizer.cache_key(text, length_option, audience, target_reduction)
+        summary = summary_cache.get_text(key)
+        cached = summary is not None
+        if not cached:
+            if chunked and count_tokens(text) > CHUNK_TOKENS:
+                summary = summarizer.summarize_text_chunked(
+                    text, length_option, audience, target_reduction, max_workers=max_workers
+                )
+            else:
+                summary = summarizer.summarize_text(text, length_option, audience, target_reduction)
+            summary_cache.set_text(key, summary)
+        return {
+            "document": name,
+            "original_chars": len(text),
+            "summary_chars": len(summary),
+            "summary": summary,
+            "cached": cached,
+            "seconds": round(time.perf_counter() - started, 2),
+            "error": "",
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(summarize_one, name, text): (name, text) for name, text in documents}
+        for future in as_completed(futures):
+            name, text = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {
+                    "document": name, "original_chars": len(text), "summary_chars": 0,
+                    "summary": "", "cached": False, "seconds": None, "error": str(e),
+                }
+
+
+def results_to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def results_to_jsonl(rows):
+    return "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n"
 
 
 # Page configuration
@@ -187,6 +389,20 @@ with st.sidebar:
         step=5,
         help="Higher values produce more concise summaries"
     )
+
+    chunked_mode = st.checkbox(
+        "Chunked mode for long documents",
+        value=True,
+        help=f"Documents over {CHUNK_TOKENS} tokens are summarized section by section in parallel, then combined"
+    )
+
+    max_workers = st.slider(
+        "Parallel sections",
+        min_value=1,
+        max_value=16,
+        value=4,
+        disabled=not chunked_mode
+    )
     
     st.markdown("""
     <div class="info-container">
@@ -196,6 +412,14 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+    with st.expander("Summary cache"):
+        cache_stats = get_summary_cache().stats()
+        st.metric("Hit rate", f"{cache_stats['hit_rate'] * 100:.0f}%")
+        st.caption(
+            f"{cache_stats['hits']} hits • {cache_stats['misses']} misses • "
+            f"{cache_stats['entries']} entries • {cache_stats['bytes_stored'] / 1024:.1f} KB stored"
+        )
+
 # Main content
 col1, col2 = st.columns([3, 2])
 
@@ -208,17 +432,37 @@ with col1:
             # Initialize summarizer
             summarizer = AzureOpenAISummarizer()
             
-            # Create a progress bar
+            # Create a progress bar driven by the pipeline stages
             with st.spinner("Analyzing document content..."):
                 progress_bar = st.progress(0)
-                for i in range(100):
-                    time.sleep(0.01)
-                    progress_bar.progress(i + 1)
+                use_chunks = chunked_mode and count_tokens(text_input) > CHUNK_TOKENS
+                progress = ProgressTracker(
+                    CHUNKED_STAGES if use_chunks else SINGLE_PASS_STAGES,
+                    on_update=lambda fraction, label: progress_bar.progress(fraction, text=label)
+                )
                 
+                # Identical text and settings are served from the shared cache
+                summary_cache = get_summary_cache()
+                cache_key = summarizer.cache_key(text_input, summary_length, audience, custom_reduction)
+                summary = summary_cache.get_text(cache_key)
+
                 # Get summary with the custom reduction target
-                summary = summarizer.summarize_text(text_input, summary_length, audience, custom_reduction)
+                if summary is not None:
+                    progress_bar.progress(1.0, text="Served from cache")
+                elif use_chunks:
+                    summary = summarizer.summarize_text_chunked(
+                        text_input, summary_length, audience, custom_reduction,
+                        max_workers=max_workers, progress=progress
+                    )
+                    summary_cache.set_text(cache_key, summary)
+                else:
+                    summary = summarizer.summarize_text(
+                        text_input, summary_length, audience, custom_reduction, progress=progress
+                    )
+                    summary_cache.set_text(cache_key, summary)
                 
                 # Display summary
+                progress.start("render")
                 with col2:
                     st.markdown('<div class="results-container">', unsafe_allow_html=True)
                     st.subheader("Summary")
@@ -235,6 +479,10 @@ with col1:
                         reduction = int((1 - len(summary)/len(text_input)) * 100)
                         st.metric("Reduction", f"{reduction}%")
                     st.markdown("</div>", unsafe_allow_html=True)
+                progress.finish("render")
+
+                with st.expander("Stage timings"):
+                    st.table(progress.timings())
                     
         except ValueError as ve:
             st.error(f"Configuration Error: {str(ve)}")
@@ -268,6 +516,74 @@ if not text_input:
         </div>
         """, unsafe_allow_html=True)
 
+# Batch mode
+st.markdown("---")
+st.header("Batch Summarization")
+st.markdown("Summarize many documents at once from text files or a zip archive")
+
+batch_files = st.file_uploader(
+    "Upload documents",
+    type=BATCH_FILE_TYPES + ["zip"],
+    accept_multiple_files=True,
+    key="batch_files"
+)
+
+bcol1, bcol2, bcol3 = st.columns(3)
+with bcol1:
+    batch_workers = st.number_input("Concurrent requests", min_value=1, max_value=32, value=8)
+with bcol2:
+    requests_per_minute = st.number_input(
+        "Requests per minute", min_value=1, value=int(st.secrets.get("AZURE_OPENAI_RPM", 60))
+    )
+with bcol3:
+    tokens_per_minute = st.number_input(
+        "Tokens per minute", min_value=1000, step=1000, value=int(st.secrets.get("AZURE_OPENAI_TPM", 60000))
+    )
+
+batch_ran = False
+if st.button("Summarize Batch", key="batch_summary_btn") and batch_files:
+    batch_ran = True
+    documents = load_documents(batch_files)
+    if not documents:
+        st.warning("No readable text documents were found in the upload")
+    else:
+        # One limiter and one set of request slots shared by every document and chunk
+        summarizer = AzureOpenAISummarizer(
+            limiter=RateLimiter(requests_per_minute, tokens_per_minute), max_in_flight=batch_workers
+        )
+
+        batch_progress = st.progress(0)
+        throughput = st.empty()
+        table = st.empty()
+
+        rows = []
+        started = time.perf_counter()
+        for row in summarize_batch(
+            documents, summarizer, get_summary_cache(), summary_length, audience,
+            custom_reduction, max_workers=batch_workers, chunked=chunked_mode
+        ):
+            rows.append(row)
+            elapsed = time.perf_counter() - started
+            batch_progress.progress(len(rows) / len(documents), text=f"{len(rows)}/{len(documents)} documents")
+            throughput.metric("Throughput", f"{len(rows) / elapsed * 60:.1f} docs/min")
+            table.dataframe(rows, use_container_width=True)
+
+        # Keep the results so the download buttons survive the rerun they trigger
+        st.session_state.batch_results = rows
+
+if st.session_state.get("batch_results"):
+    rows = st.session_state.batch_results
+    if not batch_ran:
+        st.dataframe(rows, use_container_width=True)
+    failed = sum(1 for row in rows if row["error"])
+    if failed:
+        st.warning(f"{failed} of {len(rows)} documents failed")
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        st.download_button("Download CSV", results_to_csv(rows), file_name="summaries.csv", mime="text/csv")
+    with dcol2:
+        st.download_button("Download JSONL", results_to_jsonl(rows), file_name="summaries.jsonl", mime="application/jsonl")
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -1,22 +1,35 @@
-import requests
 import streamlit as st
-import tempfile
-import os
+import io
 
-def generate_speech(text, voice="alloy", response_format="mp3", speed=1.0):
+from utils.async_client import get_async_client
+from utils.audio import CONCATENABLE_FORMATS, PROGRESSIVE_FORMATS, ProgressiveSegmenter, concat_audio, pcm_to_wav
+from utils.cache import get_cache, make_key, normalize_text
+from utils.speech import TTS_ENDPOINT
+from utils.text import content_defined_chunks
+
+# The TTS endpoint accepts at most 4096 characters of input
+TTS_MAX_CHARS = 4096
+
+# Text longer than this is synthesized in chunks of about this size in long-form mode
+LONG_FORM_CHUNK_CHARS = 1000
+# Hard cap on a long-form chunk, well under the input limit
+LONG_FORM_MAX_CHARS = min(2 * LONG_FORM_CHUNK_CHARS, TTS_MAX_CHARS)
+
+AUDIO_FORMATS = ["mp3", "wav", "opus", "aac", "flac", "pcm"]
+
+# Read the response in large blocks rather than many tiny writes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def stream_speech(text, voice="alloy", response_format="mp3", speed=1.0, chunk_size=STREAM_CHUNK_SIZE):
     """
-    Convert text to speech using Azure OpenAI's TTS endpoint
+    Convert text to speech using Azure OpenAI's TTS endpoint, yielding the
+    audio bytes as they arrive
     """
     # Endpoint and key
-    api_endpoint = "https://access-01.openai.azure.com/openai/deployments/tts/audio/speech?api-version=2024-05-01-preview"
+    api_endpoint = TTS_ENDPOINT
     api_key = st.secrets.get("AZURE_OPENAI_API_KEY", "your-api-key-here")
     
-    # Request headers and body
-    headers = {
-        "api-key": api_key,
-        "Content-Type": "application/json"
-    }
-    
+    # Request body
     payload = {
         "input": text,
         "voice": voice,
@@ -24,43 +37,86 @@ def generate_speech(text, voice="alloy", response_format="mp3", speed=1.0):
         "speed": speed
     }
     
-    # Create a temporary file to store the audio
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{response_format}")
-    file_name = temp_file.name
-    temp_file.close()
-    
+    # Make the API request; errors are raised with the API's message
+    client = get_async_client()
     try:
-        # Make the API request
-        response = requests.post(
-            api_endpoint,
-            headers=headers,
-            json=payload,
-            stream=True,
-            timeout=60
-        )
-        
-        # Check for errors
-        if response.status_code != 200:
-            try:
-                error_detail = response.json()
-                error_message = error_detail.get('error', {}).get('message', f"Error {response.status_code}")
-            except:
-                error_message = f"Error {response.status_code}: {response.text}"
-            raise Exception(error_message)
-        
-        # Write the audio data to the file
-        with open(file_name, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-        
-        return file_name
+        yield from client.iterate(client.speech_stream(api_endpoint, api_key, payload, chunk_size=chunk_size))
     except Exception as e:
-        # Clean up the temporary file if there's an error
-        if os.path.exists(file_name):
-            os.unlink(file_name)
         raise Exception(f"Speech generation failed: {str(e)}")
 
+def generate_speech(text, voice="alloy", response_format="mp3", speed=1.0):
+    """
+    Convert text to speech using Azure OpenAI's TTS endpoint
+
+    The response body is streamed in large chunks into one in-memory buffer
+    and returned as a single bytes object, with no temporary file.
+    """
+    buffer = io.BytesIO()
+    for chunk in stream_speech(text, voice, response_format, speed):
+        buffer.write(chunk)
+    # getvalue() hands over the buffer without another copy
+    return buffer.getvalue()
+
+def playable(audio_bytes, response_format):
+    """Audio data and MIME type the browser can play; raw pcm gets a WAV header"""
+    if response_format == "pcm":
+        return pcm_to_wav(audio_bytes), "audio/wav"
+    return audio_bytes, f"audio/{response_format}"
+
+def speech_cache_key(text, voice, response_format, speed):
+    return make_key(normalize_text(text), voice, speed, response_format, TTS_ENDPOINT)
+
+def get_speech_cache():
+    return get_cache("speech", max_mb=int(st.secrets.get("TTS_CACHE_MB", 512)))
+
+def split_speech_units(text):
+    """
+    Sentence-aligned chunks of about LONG_FORM_CHUNK_CHARS whose boundaries
+    are chosen by the sentences' own content, so an edit only changes the
+    chunk it falls in and every other chunk is still served from the cache
+    """
+    return content_defined_chunks(text, LONG_FORM_CHUNK_CHARS, LONG_FORM_MAX_CHARS)
+
+def synthesize_long_text(text, voice="alloy", response_format="mp3", speed=1.0):
+    """
+    Split text into sentence-aligned chunks and synthesize them concurrently.
+
+    Every chunk is cached on its own, so after an edit only the chunk
+    holding the changed sentences (occasionally with its neighbour) is sent
+    to the API. Yields (index, total, audio bytes, cached) in text order as
+    soon as the next chunk is ready, so playback can start with the first
+    one while the rest are still being generated. Concurrency is bounded by the shared async client.
+    """
+    api_key = st.secrets.get("AZURE_OPENAI_API_KEY", "your-api-key-here")
+    client = get_async_client()
+    cache = get_speech_cache()
+
+    units = split_speech_units(text)
+    keys = [speech_cache_key(unit, voice, response_format, speed) for unit in units]
+    cached = [cache.get(key) for key in keys]
+
+    futures = [
+        None if audio is not None else client.submit(client.speech(TTS_ENDPOINT, api_key, {
+            "input": unit,
+            "voice": voice,
+            "response_format": response_format,
+            "speed": speed
+        }))
+        for unit, audio in zip(units, cached)
+    ]
+    try:
+        for i, (key, audio, future) in enumerate(zip(keys, cached, futures)):
+            if future is not None:
+                audio = future.result()
+                cache.set(key, audio)
+            yield i, len(units), audio, future is None
+    except Exception as e:
+        raise Exception(f"Speech generation failed on part {i + 1} of {len(units)}: {str(e)}")
+    finally:
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
 # Streamlit app
 st.title("Text-to-Speech Generator")
 
@@ -72,7 +128,7 @@ text_input = st.text_area(
 )
 
 # Voice options
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 
 with col1:
     voice = st.selectbox(
@@ -90,36 +146,141 @@ with col2:
         step=0.1
     )
 
+with col3:
+    response_format = st.selectbox(
+        "Audio format",
+        options=AUDIO_FORMATS,
+        index=0,
+        help="pcm and wav start playing while the audio is still streaming"
+    )
+
+long_form = st.toggle(
+    "Long-form mode",
+    value=True,
+    help="Split long text at sentence boundaries and synthesize the parts in parallel"
+)
+
 # Generate button
-if st.button("Generate Speech"):
+generate = st.button("Generate Speech")
+use_long_form = long_form and len(text_input) > LONG_FORM_CHUNK_CHARS and response_format in CONCATENABLE_FORMATS
+
+# Single-request paths cache the whole text; long-form caches each chunk
+speech_cache = get_speech_cache()
+cache_key = speech_cache_key(text_input, voice, response_format, speed)
+cached_audio = None
+if generate and not use_long_form and len(text_input) <= TTS_MAX_CHARS:
+    cached_audio = speech_cache.get(cache_key)
+
+if generate and use_long_form:
+    try:
+        progress_bar = st.progress(0)
+        parts_container = st.expander("Play parts as they are ready", expanded=True)
+        parts = []
+        reused = 0
+        for index, total, audio_part, from_cache in synthesize_long_text(
+            text_input, voice=voice, response_format=response_format, speed=speed
+        ):
+            parts.append(audio_part)
+            reused += from_cache
+            progress_bar.progress((index + 1) / total, text=f"Synthesized part {index + 1} of {total}")
+            with parts_container:
+                data, mime = playable(audio_part, response_format)
+                st.audio(data, format=mime, autoplay=index == 0)
+
+        audio_bytes = concat_audio(parts, response_format)
+        data, mime = playable(audio_bytes, response_format)
+        st.audio(data, format=mime)
+        st.caption(f"{reused} of {len(parts)} parts served from the audio cache")
+        st.download_button(
+            "Download Audio",
+            data=audio_bytes,
+            file_name=f"speech_{voice}.{response_format}",
+            mime=f"audio/{response_format}"
+        )
+    except Exception as e:
+        st.error(f"Error generating speech: {str(e)}")
+
+elif generate and len(text_input) > TTS_MAX_CHARS:
+    st.warning(
+        f"Text is longer than {TTS_MAX_CHARS} characters; enable long-form mode "
+        f"with one of {', '.join(CONCATENABLE_FORMATS)}"
+    )
+
+elif generate and cached_audio is not None:
+    data, mime = playable(cached_audio, response_format)
+    st.audio(data, format=mime)
+    st.download_button(
+        "Download Audio",
+        data=cached_audio,
+        file_name=f"speech_{voice}.{response_format}",
+        mime=f"audio/{response_format}"
+    )
+    st.caption("Served from the audio cache")
+
+elif generate and response_format in PROGRESSIVE_FORMATS:
+    # Play segments while the rest of the response is still streaming
+    try:
+        segmenter = ProgressiveSegmenter(response_format)
+        buffer = io.BytesIO()
+        segments = st.expander("Playing as it streams", expanded=True)
+        played = 0
+        for chunk in stream_speech(text_input, voice=voice, response_format=response_format, speed=speed):
+            buffer.write(chunk)
+            segment = segmenter.feed(chunk)
+            if segment:
+                with segments:
+                    st.audio(segment, format="audio/wav", autoplay=played == 0)
+                played += 1
+        segment = segmenter.flush()
+        if segment:
+            with segments:
+                st.audio(segment, format="audio/wav", autoplay=played == 0)
+
+        audio_bytes = buffer.getvalue()
+        speech_cache.set(cache_key, audio_bytes)
+        data, mime = playable(audio_bytes, response_format)
+        st.audio(data, format=mime)
+        st.download_button(
+            "Download Audio",
+            data=audio_bytes,
+            file_name=f"speech_{voice}.{response_format}",
+            mime=f"audio/{response_format}"
+        )
+    except Exception as e:
+        st.error(f"Error generating speech: {str(e)}")
+
+elif generate:
     with st.spinner("Generating speech..."):
         try:
-            audio_path = generate_speech(
+            audio_bytes = generate_speech(
                 text_input,
                 voice=voice,
+                response_format=response_format,
                 speed=speed
             )
+            speech_cache.set(cache_key, audio_bytes)
             
-            # Read and display the audio
-            with open(audio_path, "rb") as audio_file:
-                audio_bytes = audio_file.read()
-            
-            st.audio(audio_bytes, format="audio/mp3")
+            # The same buffer feeds the player and the download
+            st.audio(audio_bytes, format=f"audio/{response_format}")
             
             # Option to download
             st.download_button(
                 "Download Audio",
                 data=audio_bytes,
-                file_name=f"speech_{voice}.mp3",
-                mime="audio/mp3"
+                file_name=f"speech_{voice}.{response_format}",
+                mime=f"audio/{response_format}"
             )
             
-            # Clean up
-            os.unlink(audio_path)
-            
         except Exception as e:
             st.error(f"Error generating speech: {str(e)}")
 
+with st.expander("Audio cache"):
+    cache_stats = speech_cache.stats()
+    st.caption(
+        f"{cache_stats['hits']} hits • {cache_stats['misses']} misses • "
+        f"{cache_stats['entries']} clips • {cache_stats['bytes_stored'] / (1024 * 1024):.1f} MB stored"
+    )
+
 # Voice descriptions
 with st.expander("Voice Descriptions"):
     st.markdown("""
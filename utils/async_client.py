@@ -0,0 +1,286 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import streamlit as st
+
+from utils.resilience import get_policy
+
+try:
+    import h2  # noqa: F401  HTTP/2 support for httpx is optional
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class APIError(Exception):
+    """Non-2xx response from an API, carrying the status code and headers"""
+
+    def __init__(self, message: str, status_code: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse rate-limit reset values such as "20ms", "1s", "6m0s" or a plain number of seconds"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    total, matched = 0.0, False
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value or ""):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket for requests per minute that also listens to the server.
+
+    Retry-After pauses all callers until the given time, and the
+    x-ratelimit-remaining-* headers pull the local bucket down to what the
+    service reports, so concurrent sessions back off before they hit 429s.
+    Only used from the client's event loop, so no locking is needed.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.available = float(requests_per_minute)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.available = min(self.requests_per_minute, self.available + elapsed * self.requests_per_minute / 60)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.available >= 1:
+                self.available -= 1
+                return
+            await asyncio.sleep((1 - self.available) * 60 / self.requests_per_minute)
+
+    def update(self, headers):
+        now = time.monotonic()
+        retry_after = headers.get("retry-after-ms")
+        delay = float(retry_after) / 1000 if retry_after else _parse_duration(headers.get("retry-after"))
+        if delay:
+            self.blocked_until = max(self.blocked_until, now + delay)
+
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self._refill(now)
+            self.available = min(self.available, float(remaining_requests))
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None and float(remaining_tokens) <= 0:
+            reset = _parse_duration(headers.get("x-ratelimit-reset-tokens")) or 1.0
+            self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class AsyncAzureOpenAIClient:
+    """
+    Asyncio client for the Azure OpenAI chat, speech and image endpoints.
+
+    One httpx.AsyncClient (HTTP/2 when h2 is installed) runs on a dedicated
+    event loop thread and is shared by every session. A semaphore caps the
+    requests in flight and a rate limiter per deployment paces them.
+    Synchronous code calls in through run(), submit() and iterate().
+    """
+
+    def __init__(self, max_in_flight=16, requests_per_minute=60, pool_size=20,
+                 connect_timeout=5.0, read_timeout=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="azure-openai-loop", daemon=True)
+        self._thread.start()
+
+        async def _setup():
+            self._semaphore = asyncio.Semaphore(max_in_flight)
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+
+        self.run(_setup())
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._limiters: Dict[str, AsyncRateLimiter] = {}
+
+    # -- bridging from synchronous code -------------------------------------
+
+    def run(self, coro):
+        """Run a coroutine on the client loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """Consume an async generator from synchronous code"""
+        async def _next():
+            return await agen.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self.run(_next())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    # -- request plumbing ----------------------------------------------------
+
+    def limiter(self, endpoint: str) -> AsyncRateLimiter:
+        """Rate limiter for the deployment addressed by endpoint"""
+        parts = urlsplit(endpoint)
+        key = parts.netloc + parts.path
+        if key not in self._limiters:
+            self._limiters[key] = AsyncRateLimiter(self.requests_per_minute)
+        return self._limiters[key]
+
+    def set_rate_limit(self, endpoint: str, requests_per_minute: float):
+        """Give one deployment its own requests-per-minute budget (e.g. DALL-E's much lower quota)"""
+        limiter = self.limiter(endpoint)
+        if limiter.requests_per_minute != requests_per_minute:
+            limiter.requests_per_minute = requests_per_minute
+            limiter.available = min(limiter.available, float(requests_per_minute))
+
+    @staticmethod
+    async def _raise_for_status(response: httpx.Response):
+        if response.is_success:
+            return
+        body = (await response.aread()).decode("utf-8", errors="replace")
+        try:
+            message = json.loads(body).get("error", {}).get("message") or body
+        except (ValueError, AttributeError):
+            message = body
+        raise APIError(f"Error {response.status_code}: {message}", response.status_code, dict(response.headers))
+
+    async def _post(self, endpoint: str, api_key: str, payload: Dict[str, Any], provider: str) -> httpx.Response:
+        """POST under the provider's retry/circuit-breaker policy"""
+        return await get_policy(provider).call_async(lambda: self._send(endpoint, api_key, payload))
+
+    async def _send(self, endpoint: str, api_key: str, payload: Dict[str, Any]) -> httpx.Response:
+        limiter = self.limiter(endpoint)
+        async with self._semaphore:
+            await limiter.acquire()
+            self.in_flight += 1
+            try:
+                response = await self._client.post(
+                    endpoint, headers={"api-key": api_key}, json=payload
+                )
+            finally:
+                self.in_flight -= 1
+        limiter.update(response.headers)
+        await self._raise_for_status(response)
+        return response
+
+    @asynccontextmanager
+    async def _post_stream(self, endpoint: str, api_key: str, payload: Dict[str, Any],
+                           provider: str) -> AsyncIterator[httpx.Response]:
+        """Open a streamed POST; only opening the stream is retried, never a partial body"""
+        limiter = self.limiter(endpoint)
+
+        async def open_stream():
+            await limiter.acquire()
+            request = self._client.build_request(
+                "POST", endpoint, headers={"api-key": api_key}, json=payload
+            )
+            response = await self._client.send(request, stream=True)
+            limiter.update(response.headers)
+            try:
+                await self._raise_for_status(response)
+            except APIError:
+                await response.aclose()
+                raise
+            return response
+
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                response = await get_policy(provider).call_async(open_stream)
+                try:
+                    yield response
+                finally:
+                    await response.aclose()
+            finally:
+                self.in_flight -= 1
+
+    # -- endpoints -----------------------------------------------------------
+
+    async def chat_completion(self, endpoint: str, api_key: str, payload: Dict[str, Any],
+                              provider: str = "azure-openai") -> Dict[str, Any]:
+        response = await self._post(endpoint, api_key, payload, provider)
+        return response.json()
+
+    async def chat_completion_stream(self, endpoint: str, api_key: str,
+                                     payload: Dict[str, Any],
+                                     provider: str = "azure-openai") -> AsyncIterator[Dict[str, Any]]:
+        """Yield the parsed server-sent-event chunks of a streamed chat completion"""
+        payload = {**payload, "stream": True}
+        async with self._post_stream(endpoint, api_key, payload, provider) as response:
+            async for line in response.aiter_lines():
+                # SSE frames look like "data: {...}"; blank lines separate events
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                yield json.loads(data)
+
+    async def speech(self, endpoint: str, api_key: str, payload: Dict[str, Any],
+                     provider: str = "azure-tts") -> bytes:
+        response = await self._post(endpoint, api_key, payload, provider)
+        return response.content
+
+    async def speech_stream(self, endpoint: str, api_key: str, payload: Dict[str, Any],
+                            chunk_size: int = 64 * 1024, provider: str = "azure-tts") -> AsyncIterator[bytes]:
+        async with self._post_stream(endpoint, api_key, payload, provider) as response:
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+
+    async def image_generation(self, endpoint: str, api_key: str, payload: Dict[str, Any],
+                               provider: str = "azure-dalle") -> Dict[str, Any]:
+        response = await self._post(endpoint, api_key, payload, provider)
+        return response.json()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "limiters": {
+                key: {"available": round(limiter.available, 2),
+                      "blocked_for": round(max(limiter.blocked_until - time.monotonic(), 0.0), 2)}
+                for key, limiter in self._limiters.items()
+            },
+        }
+
+
+@st.cache_resource
+def get_async_client() -> AsyncAzureOpenAIClient:
+    """Return the shared async client, created once per server process"""
+    return AsyncAzureOpenAIClient(
+        max_in_flight=int(st.secrets.get("AZURE_OPENAI_MAX_IN_FLIGHT", 16)),
+        requests_per_minute=float(st.secrets.get("AZURE_OPENAI_RPM", 60)),
+        pool_size=int(st.secrets.get("HTTP_POOL_SIZE", 10)),
+        connect_timeout=float(st.secrets.get("HTTP_CONNECT_TIMEOUT", 5)),
+        read_timeout=float(st.secrets.get("HTTP_READ_TIMEOUT", 60)),
+    )
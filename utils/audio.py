@@ -0,0 +1,275 @@
+import io
+import wave
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from pydub import AudioSegment  # optional; needs ffmpeg for mp3/m4a
+    from pydub.exceptions import CouldntEncodeError
+except ImportError:
+    AudioSegment = None
+    CouldntEncodeError = OSError
+
+# Formats whose independently encoded parts can be joined into one file
+CONCATENABLE_FORMATS = ("mp3", "wav", "pcm")
+
+
+def concat_wav(parts: List[bytes]) -> bytes:
+    """Join WAV files with identical sample format into a single WAV"""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        for i, part in enumerate(parts):
+            with wave.open(io.BytesIO(part), "rb") as reader:
+                if i == 0:
+                    writer.setparams(reader.getparams())
+                writer.writeframes(reader.readframes(reader.getnframes()))
+    return output.getvalue()
+
+
+def concat_audio(parts: List[bytes], response_format: str) -> bytes:
+    """
+    Concatenate separately synthesized audio parts in order.
+
+    MP3 is a sequence of self-contained frames and raw pcm has no framing,
+    so those parts are simply appended; WAV parts are re-wrapped under a
+    single header.
+    """
+    if response_format in ("mp3", "pcm"):
+        return b"".join(parts)
+    if response_format == "wav":
+        return concat_wav(parts)
+    raise ValueError(f"Cannot concatenate {response_format} audio; use one of {', '.join(CONCATENABLE_FORMATS)}")
+
+
+# Raw pcm from the TTS endpoint is 24 kHz, 16-bit, mono
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+# Formats that can be played progressively while the response is streaming
+PROGRESSIVE_FORMATS = ("pcm", "wav")
+
+
+def pcm_to_wav(pcm, sample_rate=PCM_SAMPLE_RATE, channels=PCM_CHANNELS, sample_width=PCM_SAMPLE_WIDTH) -> bytes:
+    """Wrap raw little-endian pcm in a WAV header so browsers can play it"""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(sample_width)
+        writer.setframerate(sample_rate)
+        writer.writeframes(pcm)
+    return output.getvalue()
+
+
+class ProgressiveSegmenter:
+    """
+    Cuts a streamed pcm or wav response into independently playable WAV
+    segments of roughly segment_seconds each, so playback can begin before
+    the whole response has arrived.
+    """
+
+    def __init__(self, response_format: str, segment_seconds: float = 5.0):
+        if response_format not in PROGRESSIVE_FORMATS:
+            raise ValueError(f"{response_format} cannot be played progressively")
+        self.response_format = response_format
+        self.segment_seconds = segment_seconds
+        self.sample_rate = PCM_SAMPLE_RATE
+        self.channels = PCM_CHANNELS
+        self.sample_width = PCM_SAMPLE_WIDTH
+        self._header_done = response_format == "pcm"
+        self._pending = bytearray()
+
+    @property
+    def _frame_size(self):
+        return self.channels * self.sample_width
+
+    def _parse_header(self) -> bool:
+        """Consume the RIFF header once the data chunk has started"""
+        data_at = self._pending.find(b"data")
+        fmt_at = self._pending.find(b"fmt ")
+        if data_at < 0 or fmt_at < 0 or len(self._pending) < data_at + 8:
+            return False
+        fmt = bytes(self._pending[fmt_at + 8:fmt_at + 24])
+        self.channels = int.from_bytes(fmt[2:4], "little")
+        self.sample_rate = int.from_bytes(fmt[4:8], "little")
+        self.sample_width = int.from_bytes(fmt[14:16], "little") // 8
+        del self._pending[:data_at + 8]
+        return True
+
+    def feed(self, chunk: bytes):
+        """Add streamed bytes; returns a WAV segment when enough audio has accumulated"""
+        self._pending += chunk
+        if not self._header_done:
+            self._header_done = self._parse_header()
+            if not self._header_done:
+                return None
+        segment_bytes = int(self.segment_seconds * self.sample_rate) * self._frame_size
+        if len(self._pending) < segment_bytes:
+            return None
+        return self._cut(len(self._pending) - len(self._pending) % self._frame_size)
+
+    def flush(self):
+        """Return whatever audio is left once the stream has ended"""
+        if not self._header_done or not self._pending:
+            return None
+        return self._cut(len(self._pending) - len(self._pending) % self._frame_size)
+
+    def _cut(self, size):
+        segment = pcm_to_wav(bytes(self._pending[:size]), self.sample_rate, self.channels, self.sample_width)
+        del self._pending[:size]
+        return segment
+
+
+def _pcm_to_float(frames: bytes, sample_width: int) -> np.ndarray:
+    """Interleaved little-endian pcm to float32 in [-1, 1]"""
+    if sample_width == 1:
+        return (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    if sample_width == 3:
+        raw = np.frombuffer(frames, np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        return ints.astype(np.float32) / float(1 << 23)
+    dtype = {2: np.int16, 4: np.int32}[sample_width]
+    return np.frombuffer(frames, dtype).astype(np.float32) / float(1 << (8 * sample_width - 1))
+
+
+# Frames read and converted at a time when decoding WAV
+DECODE_BLOCK_FRAMES = 1 << 16
+
+
+def _downmix(samples: np.ndarray, channels: int) -> np.ndarray:
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def _resample_blocks(blocks: Iterable[np.ndarray], sample_rate: int, target_rate: int,
+                     total: int) -> np.ndarray:
+    """
+    Linearly resample total mono samples, arriving as consecutive blocks,
+    into one float32 array. Interpolation positions are computed per block
+    in index space, so no full-length time grid is ever built.
+    """
+    step = sample_rate / target_rate
+    output = np.empty(int((total - 1) / step) + 1 if total else 0, dtype=np.float32)
+    written = 0
+    # The last sample of the previous block, so outputs between blocks can be interpolated
+    carry = np.empty(0, dtype=np.float32)
+    start = 0
+    for block in blocks:
+        source = np.concatenate([carry, block]) if len(carry) else block
+        if not len(source):
+            continue
+        end = min(int((start + len(source) - 1) / step) + 1, len(output))
+        if end > written:
+            positions = np.arange(written, end) * step - start
+            output[written:end] = np.interp(positions, np.arange(len(source)), source)
+            written = end
+        carry = source[-1:]
+        start += len(source) - 1
+    return output[:written]
+
+
+def decode_audio(data: bytes, file_name: str = "", target_rate: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    Decode an audio file to mono float32 samples and its sample rate.
+
+    WAV is decoded with the standard library; other formats need pydub
+    (and ffmpeg) to be installed. With target_rate, the audio is downmixed
+    and resampled while decoding (WAV in blocks, other formats by pydub),
+    so the full-rate recording is never held as floats.
+    """
+    if data[:4] == b"RIFF":
+        with wave.open(io.BytesIO(data), "rb") as reader:
+            channels = reader.getnchannels()
+            sample_rate = reader.getframerate()
+            width = reader.getsampwidth()
+            frames = reader.getnframes()
+            if target_rate is None or target_rate == sample_rate:
+                return _downmix(_pcm_to_float(reader.readframes(frames), width), channels), sample_rate
+            blocks = (
+                _downmix(_pcm_to_float(reader.readframes(DECODE_BLOCK_FRAMES), width), channels)
+                for _ in range(0, frames, DECODE_BLOCK_FRAMES)
+            )
+            return _resample_blocks(blocks, sample_rate, target_rate, frames), target_rate
+    if AudioSegment is None:
+        raise RuntimeError(f"Decoding {file_name or 'this file'} requires pydub and ffmpeg; upload a WAV file instead")
+
+    try:
+        segment = AudioSegment.from_file(io.BytesIO(data), format=file_name.rsplit(".", 1)[-1].lower() or None)
+    except FileNotFoundError:
+        raise RuntimeError(f"Decoding {file_name or 'this file'} requires ffmpeg; upload a WAV file instead")
+    segment = segment.set_channels(1)
+    if target_rate is not None:
+        segment = segment.set_frame_rate(target_rate)
+    return _pcm_to_float(segment.raw_data, segment.sample_width), segment.frame_rate
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Encode mono float samples as 16-bit WAV"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    return pcm_to_wav(pcm, sample_rate=sample_rate, channels=1, sample_width=2)
+
+
+def find_split_points(samples: np.ndarray, sample_rate: int, max_seconds: float,
+                      search_seconds: float = 20.0, frame_seconds: float = 0.02) -> List[int]:
+    """
+    Sample offsets that cut the audio into pieces no longer than max_seconds.
+
+    Each cut is placed in the quietest frame of the last search_seconds
+    before the limit, so words are rarely split. The first offset is 0 and
+    the last is len(samples).
+    """
+    frame = max(int(frame_seconds * sample_rate), 1)
+    max_samples = int(max_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), max_samples // 2)
+
+    cuts = [0]
+    while len(samples) - cuts[-1] > max_samples:
+        window_end = cuts[-1] + max_samples
+        window = samples[window_end - search:window_end]
+        frames = window[:len(window) - len(window) % frame].reshape(-1, frame)
+        # RMS energy per frame; the quietest one is the most silence-like point
+        energy = np.sqrt(np.mean(frames ** 2, axis=1))
+        quietest = int(np.argmin(energy))
+        cuts.append(window_end - search + quietest * frame + frame // 2)
+    cuts.append(len(samples))
+    return cuts
+
+
+# Whisper works on 16 kHz mono internally, so anything more is wasted upload
+SPEECH_SAMPLE_RATE = 16000
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """Linear-interpolation resampling; adequate for speech recognition input"""
+    if sample_rate == target_rate:
+        return samples
+    blocks = (samples[i:i + DECODE_BLOCK_FRAMES] for i in range(0, len(samples), DECODE_BLOCK_FRAMES))
+    return _resample_blocks(blocks, sample_rate, target_rate, len(samples))
+
+
+def encode_speech(samples: np.ndarray, sample_rate: int, codec: str = "opus",
+                  bitrate: str = "24k") -> Tuple[bytes, str, str]:
+    """
+    Compress mono speech for upload, returning (data, extension, mime type).
+
+    Uses Opus in Ogg (or MP3) through pydub/ffmpeg when available and falls
+    back to 16-bit WAV otherwise, including when pydub is installed but
+    ffmpeg or the codec is missing.
+    """
+    if AudioSegment is None or codec == "wav":
+        return encode_wav(samples, sample_rate), "wav", "audio/wav"
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    segment = AudioSegment(pcm, frame_rate=sample_rate, sample_width=2, channels=1)
+    output = io.BytesIO()
+    try:
+        if codec == "opus":
+            segment.export(output, format="ogg", codec="libopus", bitrate=bitrate)
+            return output.getvalue(), "ogg", "audio/ogg"
+        segment.export(output, format="mp3", bitrate=bitrate)
+        return output.getvalue(), "mp3", "audio/mpeg"
+    except (OSError, CouldntEncodeError):
+        # No ffmpeg on the PATH (FileNotFoundError) or no encoder for the codec
+        return encode_wav(samples, sample_rate), "wav", "audio/wav"
@@ -0,0 +1,97 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """
+    (left, top, right, bottom) of overlapping tiles covering a width x height
+    image. Neighbouring tiles share overlap * tile_size pixels so an object
+    cut by one tile edge is seen whole by the next tile; the last row and
+    column are aligned to the image edge.
+    """
+    step = max(int(tile_size * (1 - overlap)), 1)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        return positions + [length - tile_size]
+
+    return [
+        (left, top, min(left + tile_size, width), min(top + tile_size, height))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (n, 4) and (m, 4) arrays of [x1, y1, x2, y2] boxes"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5,
+                        labels: Optional[Sequence] = None, block_size: int = 512) -> np.ndarray:
+    """
+    Indices of the boxes kept by greedy non-maximum suppression, best first.
+
+    boxes is an (n, 4) array of [x1, y1, x2, y2]. Overlapping pairs are
+    found with vectorized IoU over blocks of block_size boxes swept along
+    x, each compared only with boxes that can still intersect it, and the
+    greedy pass then just walks the sparse list of pairs above
+    iou_threshold. With labels, boxes only
+    suppress boxes of the same label: each label is shifted into its own
+    coordinate range so one pass handles all of them.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    if labels is not None:
+        _, label_ids = np.unique(np.asarray(labels), return_inverse=True)
+        offset = boxes.max() - min(boxes.min(), 0) + 1
+        boxes = boxes + (label_ids * offset)[:, None]
+
+    order = np.argsort(-scores, kind="stable")
+    count = len(boxes)
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+
+    # Find every pair overlapping too much. Sweeping in x1 order, a block
+    # only needs comparing with the boxes that start before it ends.
+    by_x = np.argsort(boxes[:, 0], kind="stable")
+    sorted_boxes = boxes[by_x]
+    rows, cols = [], []
+    for start in range(0, count, block_size):
+        block = sorted_boxes[start:start + block_size]
+        end = np.searchsorted(sorted_boxes[:, 0], block[:, 2].max(), side="left")
+        block_rows, block_cols = np.nonzero(iou_matrix(block, sorted_boxes[start:end]) > iou_threshold)
+        later = block_cols > block_rows
+        first_rank = rank[by_x[block_rows[later] + start]]
+        second_rank = rank[by_x[block_cols[later] + start]]
+        rows.append(np.minimum(first_rank, second_rank))
+        cols.append(np.maximum(first_rank, second_rank))
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    # Pairs as (better, worse) in score rank, grouped by the better box
+    grouped = np.argsort(rows, kind="stable")
+    rows, cols = rows[grouped], cols[grouped]
+    first = np.searchsorted(rows, np.arange(count), side="left")
+    last = np.searchsorted(rows, np.arange(count), side="right")
+
+    suppressed = np.zeros(count, dtype=bool)
+    keep = []
+    for i in range(count):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if last[i] > first[i]:
+            suppressed[cols[first[i]:last[i]]] = True
+    return order[np.asarray(keep, dtype=np.int64)]
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+import streamlit as st
+
+
+def make_key(*parts: Any) -> str:
+    """Content-addressed key: SHA-256 over the JSON encoding of parts"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic edits still hit the cache"""
+    return " ".join(text.split())
+
+
+class DiskCache:
+    """
+    Size-bounded key/value store backed by SQLite.
+
+    The database file is shared by every session and every server process
+    that points at the same cache directory. Entries older than ttl seconds
+    are treated as missing, and once the stored bytes exceed max_bytes the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads and processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(False)
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count(False)
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self._count(True)
+        return bytes(value)
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until enough bytes are freed
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def get_text(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set_text(self, key: str, value: str):
+        self.set(key, value.encode("utf-8"))
+
+    def get_json(self, key: str) -> Any:
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value: Any):
+        self.set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            entries, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes_stored": stored,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries")
+
+
+@st.cache_resource
+def get_cache(namespace: str, max_mb: int = 256, ttl: Optional[float] = None) -> DiskCache:
+    """Return the shared on-disk cache for namespace (one SQLite file per namespace)"""
+    cache_dir = st.secrets.get("CACHE_DIR", ".cache")
+    return DiskCache(os.path.join(cache_dir, f"{namespace}.sqlite3"), max_mb * 1024 * 1024, ttl)
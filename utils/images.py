@@ -0,0 +1,134 @@
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+from PIL import Image, features
+
+# Longest side of the derivatives served to the browser
+PREVIEW_SIDE = 1024
+THUMBNAIL_SIDE = 256
+
+
+class ImageStore:
+    """
+    Content-addressed image store on local disk.
+
+    Each image lives under its key (e.g. a hash of prompt/size/quality) as
+    the original file plus a compact preview and thumbnail. The derivatives
+    are WebP when Pillow supports it, JPEG otherwise, and are produced on a
+    background thread so saving an original returns immediately.
+    """
+
+    def __init__(self, root: str, quality: int = 80, workers: int = 2):
+        self.root = root
+        self.quality = quality
+        self.format = "WEBP" if features.check("webp") else "JPEG"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-store")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def mime(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self._dir(key), name)
+
+    def _derivative_name(self, kind: str) -> str:
+        return f"{kind}.{'webp' if self.format == 'WEBP' else 'jpg'}"
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._path(key, "original"))
+
+    def put(self, key: str, data: bytes):
+        """Store the original image and schedule its derivatives"""
+        os.makedirs(self._dir(key), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        temporary = self._path(key, "original.tmp")
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, self._path(key, "original"))
+        with self._lock:
+            self._pending[key] = self._executor.submit(self._make_derivatives, key, data)
+
+    def _make_derivatives(self, key: str, data: bytes):
+        try:
+            image = Image.open(io.BytesIO(data))
+            image = image.convert("RGBA" if self.format == "WEBP" and image.mode in ("RGBA", "LA", "P") else "RGB")
+            for kind, side in (("preview", PREVIEW_SIDE), ("thumbnail", THUMBNAIL_SIDE)):
+                derivative = image.copy()
+                derivative.thumbnail((side, side), Image.LANCZOS)
+                output = io.BytesIO()
+                derivative.save(output, format=self.format, quality=self.quality)
+                temporary = self._path(key, f"{kind}.tmp")
+                with open(temporary, "wb") as f:
+                    f.write(output.getvalue())
+                os.replace(temporary, self._path(key, self._derivative_name(kind)))
+        finally:
+            # Forget a failed encode too, so the next request retries it
+            # instead of re-raising the stored error forever
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def original(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key, "original"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def derivative(self, key: str, kind: str = "preview") -> Optional[bytes]:
+        """Preview or thumbnail bytes, waiting for the background encode if it is still running"""
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            pending.result()
+        path = self._path(key, self._derivative_name(kind))
+        if not os.path.exists(path) and self.has(key):
+            # Stored by an older process or with another derivative format
+            self._make_derivatives(key, self.original(key))
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def sizes(self, key: str) -> Tuple[int, int, int]:
+        """Bytes of (original, preview, thumbnail)"""
+        return tuple(
+            os.path.getsize(self._path(key, name)) if os.path.exists(self._path(key, name)) else 0
+            for name in ("original", self._derivative_name("preview"), self._derivative_name("thumbnail"))
+        )
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pair of pixels in a
+    (size + 1) x size grayscale thumbnail. Near-identical images get hashes
+    a small Hamming distance apart.
+    """
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+@st.cache_resource
+def get_image_store() -> ImageStore:
+    """Return the shared image store, created once per server process"""
+    cache_dir = st.secrets.get("CACHE_DIR", ".cache")
+    return ImageStore(
+        os.path.join(cache_dir, "images"),
+        quality=int(st.secrets.get("IMAGE_PREVIEW_QUALITY", 80)),
+    )
@@ -0,0 +1,87 @@
+import io
+import os
+import uuid
+from typing import BinaryIO, Dict, Optional
+
+
+class MultipartStream(io.RawIOBase):
+    """
+    multipart/form-data body that is read straight from the file object.
+
+    requests would otherwise build the whole encoded body in memory; this
+    stream produces the part headers, then the file in blocks of whatever
+    size the HTTP client asks for, then the closing boundary. It knows its
+    length up front, so the upload goes out with Content-Length rather than
+    chunked encoding, and seek(0) rewinds it for a retry.
+    """
+
+    def __init__(self, file_field: str, file_name: str, fileobj: BinaryIO,
+                 content_type: str = "application/octet-stream", fields: Optional[Dict[str, str]] = None):
+        super().__init__()
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        head = b""
+        for name, value in (fields or {}).items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        self._file = fileobj
+        self._file_start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        file_size = fileobj.tell() - self._file_start
+        fileobj.seek(self._file_start)
+
+        self._parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self._length = len(head) + file_size + len(tail)
+        self._index = 0
+        self.bytes_sent = 0
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset != 0 or whence != os.SEEK_SET:
+            raise io.UnsupportedOperation("MultipartStream can only be rewound to the start")
+        self._parts[0].seek(0)
+        self._file.seek(self._file_start)
+        self._parts[2].seek(0)
+        self._index = 0
+        self.bytes_sent = 0
+        return 0
+
+    def tell(self):
+        return self.bytes_sent
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        out = bytearray()
+        while len(out) < size and self._index < len(self._parts):
+            block = self._parts[self._index].read(size - len(out))
+            if not block:
+                self._index += 1
+                continue
+            out += block
+        self.bytes_sent += len(out)
+        return bytes(out)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
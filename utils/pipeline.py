@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Marks the end of the input on a queue
+_END = object()
+
+
+class Stage:
+    """One step of a Pipeline: fn is applied to every item by its own worker threads"""
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.max_seconds = 0.0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+
+    def _record(self, seconds: float, queue_depth: int):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+
+class Pipeline:
+    """
+    Streams items through stages connected by bounded queues.
+
+    Every stage runs on its own threads, so while one item is in the last
+    stage the next ones are already in the earlier stages, and the total
+    time approaches that of the slowest stage rather than the sum of all
+    of them. A full queue blocks the stage feeding it, which keeps a fast
+    stage from running far ahead of a slow one. Results are yielded in
+    input order.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._queues: List[queue.Queue] = []
+        self._stop = threading.Event()
+        self._error = None
+        self.started = None
+        self.finished = None
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, items: Iterable):
+        try:
+            for index, item in enumerate(items):
+                if not self._put(self._queues[0], (index, item)):
+                    return
+        except Exception as e:
+            self._fail(e)
+            return
+        for _ in range(self.stages[0].workers):
+            self._put(self._queues[0], _END)
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _work(self, position: int, remaining: List[int], lock: threading.Lock):
+        stage = self.stages[position]
+        inbox, outbox = self._queues[position], self._queues[position + 1]
+        while not self._stop.is_set():
+            try:
+                entry = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if entry is _END:
+                with lock:
+                    remaining[position] -= 1
+                    last = remaining[position] == 0
+                # The last worker of a stage passes the end on to every worker of the next
+                if last:
+                    following = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+                    for _ in range(following):
+                        self._put(outbox, _END)
+                return
+            index, item = entry
+            depth = inbox.qsize()
+            started = time.perf_counter()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                self._fail(e)
+                return
+            stage._record(time.perf_counter() - started, depth)
+            self._put(outbox, (index, result))
+
+    def run(self, items: Iterable) -> Iterator[Tuple[int, Any]]:
+        """Yield (index, result) for every item, in input order, as results become ready"""
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # Results are drained by the caller, so the last queue is unbounded
+        self._queues.append(queue.Queue())
+        self._stop.clear()
+        self._error = None
+        self.started = time.perf_counter()
+
+        remaining = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=self._work, args=(position, remaining, lock),
+                                 name=f"pipeline-{stage.name}", daemon=True)
+                for _ in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+
+        pending: Dict[int, Any] = {}
+        next_index = 0
+        output = self._queues[-1]
+        try:
+            while True:
+                if self._error is not None:
+                    raise self._error
+                try:
+                    entry = output.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if entry is _END:
+                    break
+                index, result = entry
+                pending[index] = result
+                while next_index in pending:
+                    yield next_index, pending.pop(next_index)
+                    next_index += 1
+        finally:
+            self.finished = time.perf_counter()
+            self._stop.set()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-stage throughput, latency and queue depth"""
+        rows = []
+        for stage, inbox in zip(self.stages, self._queues):
+            rows.append({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "mean_latency_s": round(stage.busy_seconds / stage.processed, 3) if stage.processed else 0.0,
+                "max_latency_s": round(stage.max_seconds, 3),
+                "busy_s": round(stage.busy_seconds, 3),
+                "queue_depth": inbox.qsize(),
+                "max_queue_depth": stage.max_queue_depth,
+            })
+        return rows
+
+    def elapsed(self) -> float:
+        """Wall-clock seconds from start to the last result (or now, while running)"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
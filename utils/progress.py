@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class ProgressTracker:
+    """
+    Progress and timing events emitted by the real pipeline stages.
+
+    Each stage has a weight; the overall fraction is the weighted share of
+    finished work, so a progress bar driven from on_update only moves when a
+    stage actually makes progress. The same events are kept as structured
+    timings for profiling.
+
+    Events must be emitted from the Streamlit script thread when on_update
+    touches Streamlit elements.
+    """
+
+    def __init__(self, stages: Dict[str, float], on_update: Optional[Callable[[float, str], None]] = None):
+        total = sum(stages.values()) or 1.0
+        self.weights = {name: weight / total for name, weight in stages.items()}
+        self.on_update = on_update
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._fractions = {name: 0.0 for name in stages}
+        self._started: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+
+    def _emit(self, stage: str, event: str, **detail):
+        now = time.perf_counter() - self._origin
+        self.events.append({"stage": stage, "event": event, "at": round(now, 4), **detail})
+        if self.on_update:
+            label = stage.replace("_", " ").capitalize()
+            if "done" in detail and "total" in detail:
+                label += f" ({detail['done']}/{detail['total']})"
+            self.on_update(self.progress(), label)
+
+    def start(self, stage: str):
+        self._started.setdefault(stage, time.perf_counter() - self._origin)
+        self._emit(stage, "start")
+
+    def advance(self, stage: str, done: int, total: int):
+        """Report partial completion of a stage, e.g. chunks completed"""
+        self._started.setdefault(stage, time.perf_counter() - self._origin)
+        # A stage never moves backwards, even if its estimated total grows
+        fraction = min(done / total, 1.0) if total else 1.0
+        self._fractions[stage] = max(self._fractions.get(stage, 0.0), fraction)
+        self._emit(stage, "advance", done=done, total=total)
+
+    def finish(self, stage: str):
+        self._started.setdefault(stage, time.perf_counter() - self._origin)
+        self._finished[stage] = time.perf_counter() - self._origin
+        self._fractions[stage] = 1.0
+        self._emit(stage, "finish")
+
+    @contextmanager
+    def stage(self, name: str):
+        self.start(name)
+        try:
+            yield self
+        finally:
+            self.finish(name)
+
+    def progress(self) -> float:
+        return min(sum(self.weights.get(s, 0.0) * f for s, f in self._fractions.items()), 1.0)
+
+    def timings(self) -> List[Dict]:
+        """Start, end and duration in seconds of every stage that ran"""
+        rows = []
+        for stage, started in self._started.items():
+            finished = self._finished.get(stage)
+            rows.append({
+                "stage": stage,
+                "start": round(started, 4),
+                "end": round(finished, 4) if finished is not None else None,
+                "duration": round(finished - started, 4) if finished is not None else None,
+            })
+        return rows
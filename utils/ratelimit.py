@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe token-bucket limiter for requests and tokens per minute.
+
+    acquire() blocks until one request slot and the requested number of
+    tokens are available. Both buckets start full and refill continuously,
+    so short bursts up to the per-minute budget are allowed.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Wait for capacity and return the number of seconds spent waiting"""
+        if self.tokens_per_minute:
+            # A single oversized request can never wait for more than a full bucket
+            tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                need_tokens = tokens if self.tokens_per_minute else 0
+                if self._requests >= 1 and self._tokens >= need_tokens:
+                    self._requests -= 1
+                    self._tokens -= need_tokens
+                    return waited
+                delay = (1 - self._requests) * 60 / self.requests_per_minute if self._requests < 1 else 0.0
+                if need_tokens > self._tokens:
+                    delay = max(delay, (need_tokens - self._tokens) * 60 / self.tokens_per_minute)
+            delay = max(delay, 0.01)
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,281 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import requests
+
+try:
+    import httpx
+    _TRANSIENT_EXCEPTIONS = (
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+        httpx.ConnectError, httpx.ReadError, httpx.TimeoutException,
+    )
+    _TRANSPORT_EXCEPTIONS = (requests.RequestException, httpx.HTTPError)
+except ImportError:
+    _TRANSIENT_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    _TRANSPORT_EXCEPTIONS = (requests.RequestException,)
+
+# Statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Per-provider overrides of the ResiliencePolicy defaults
+PROVIDER_SETTINGS = {
+    "azure-openai": {"max_attempts": 4, "max_delay": 30.0},
+    "azure-dalle": {"max_attempts": 3, "max_delay": 30.0},
+    "azure-tts": {"max_attempts": 4},
+    "whisper": {"max_attempts": 3},
+    "google-translate": {"max_attempts": 4},
+    "google-vision": {"max_attempts": 4},
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+# What a call through a policy raises when the provider cannot be reached:
+# the breaker failing fast, or the transport error once retries run out
+UNAVAILABLE_ERRORS = (CircuitOpenError,) + _TRANSPORT_EXCEPTIONS
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failures; open fails
+    fast for reset_timeout seconds, then half-open lets one trial call
+    through, which closes the circuit on success and reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests (plus a small floor), so a
+    struggling provider is not hit with a multiple of the normal load.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.remaining_limit():
+                return False
+            self._retries.append(now)
+            return True
+
+    def remaining_limit(self) -> int:
+        return max(self.min_retries, int(len(self._requests) * self.ratio))
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._trim(time.monotonic())
+            return max(self.remaining_limit() - len(self._retries), 0)
+
+
+class ResiliencePolicy:
+    """
+    Retry with full-jitter exponential backoff, a retry budget and a circuit
+    breaker for one provider. Works for both requests (call) and asyncio
+    (call_async) code paths.
+    """
+
+    def __init__(self, provider: str, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 20.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 budget_ratio: float = 0.2):
+        self.provider = provider
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.budget = RetryBudget(budget_ratio)
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0, "budget_exhausted": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^attempt)], never sooner than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _before_attempt(self):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(
+                f"{self.provider} is unavailable (circuit open); retry in a few seconds"
+            )
+        self.budget.record_request()
+
+    def _classify(self, status: Optional[int], error: Optional[BaseException]) -> bool:
+        """Record the outcome with the breaker and return whether it is retryable"""
+        if error is not None:
+            retryable = isinstance(error, _TRANSIENT_EXCEPTIONS)
+        else:
+            retryable = status in RETRYABLE_STATUSES
+        # Throttling means the provider is up, so 429 does not trip the breaker
+        if retryable and status != 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return retryable
+
+    def _may_retry(self, attempt: int) -> bool:
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if not self.budget.try_spend():
+            self._count("budget_exhausted")
+            return False
+        self._count("retries")
+        return True
+
+    def call(self, send: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Run send() until it returns a non-retryable response or attempts run out.
+
+        Retryable responses on the last attempt are returned to the caller
+        unchanged so it can report the provider's error.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                response = send()
+            except Exception as e:
+                if not self._classify(None, e) or not self._may_retry(attempt):
+                    self._count("failures")
+                    raise
+                time.sleep(self.backoff(attempt))
+            else:
+                if not self._classify(response.status_code, None) or not self._may_retry(attempt):
+                    if response.status_code in RETRYABLE_STATUSES:
+                        self._count("failures")
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                time.sleep(self.backoff(attempt, retry_after))
+            attempt += 1
+
+    async def call_async(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await send() with the same policy; HTTP failures must be raised as
+        exceptions carrying status_code and headers attributes.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                result = await send()
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                retryable = self._classify(status, None if status is not None else e)
+                if not retryable or not self._may_retry(attempt):
+                    self._count("failures")
+                    raise
+                retry_after = parse_retry_after(getattr(e, "headers", {}).get("retry-after"))
+                await asyncio.sleep(self.backoff(attempt, retry_after))
+            else:
+                self.breaker.record_success()
+                return result
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_budget_remaining": self.budget.remaining(),
+            **self.counters,
+        }
+
+
+_policies: Dict[str, ResiliencePolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(provider: str) -> ResiliencePolicy:
+    """Process-wide policy for provider, created on first use"""
+    with _policies_lock:
+        if provider not in _policies:
+            _policies[provider] = ResiliencePolicy(provider, **PROVIDER_SETTINGS.get(provider, {}))
+        return _policies[provider]
+
+
+def policy_stats() -> Dict[str, Dict[str, Any]]:
+    """Breaker state and retry counters for every provider used so far"""
+    with _policies_lock:
+        return {provider: policy.stats() for provider, policy in _policies.items()}
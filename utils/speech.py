@@ -0,0 +1,51 @@
+import io
+
+import streamlit as st
+
+from utils.multipart import MultipartStream
+
+TTS_ENDPOINT = "https://access-01.openai.azure.com/openai/deployments/tts/audio/speech?api-version=2024-05-01-preview"
+
+
+class TranscriptionError(Exception):
+    def __init__(self, status_code, details):
+        super().__init__(f"Transcription failed with status {status_code}")
+        self.status_code = status_code
+        self.details = details
+
+
+def post_whisper(transport, audio_bytes, file_name, mime_type, verbose=False):
+    """Send one file to the Whisper endpoint and return the parsed response"""
+    api_url = st.secrets["api_url"]
+    api_key = st.secrets["api_key"]
+
+    # Uploading the file as a form-data POST request, streamed from the
+    # buffer in blocks instead of building the encoded body in memory
+    body = MultipartStream(
+        "file", file_name, io.BytesIO(audio_bytes), mime_type,
+        fields={"response_format": "verbose_json"} if verbose else None,
+    )
+
+    # API headers
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "api-key": api_key,
+        "Content-Type": body.content_type,
+    }
+
+    response = transport.post(api_url, provider="whisper", headers=headers, data=body)
+    if response.status_code != 200:
+        raise TranscriptionError(response.status_code, response.text)
+    return response.json()
+
+
+def synthesize_speech(client, text, voice="alloy", response_format="mp3", speed=1.0):
+    """Synthesize text in one TTS request through the shared async client"""
+    api_key = st.secrets.get("AZURE_OPENAI_API_KEY", "your-api-key-here")
+    payload = {
+        "input": text,
+        "voice": voice,
+        "response_format": response_format,
+        "speed": speed
+    }
+    return client.run(client.speech(TTS_ENDPOINT, api_key, payload))
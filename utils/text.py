@@ -0,0 +1,156 @@
+import hashlib
+import re
+from typing import Callable, List, Sequence, Tuple
+
+from utils.tokens import count_tokens
+
+# Sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) and whitespace
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Blank lines between paragraphs, with the whitespace around them
+_PARAGRAPH_SEPARATOR = re.compile(r"(\s*\n[ \t]*\n\s*)")
+# Whitespace after a sentence end, possibly past closing quotes/brackets
+_SENTENCE_SEPARATOR = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+')
+# Words ending in a period that rarely end a sentence
+_ABBREVIATIONS = {"e.g.", "i.e.", "mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "cf.", "no.", "fig.", "approx."}
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text on blank lines, dropping empty paragraphs"""
+    return [p.strip() for p in _PARAGRAPH_BREAK.split(text) if p.strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a paragraph into sentences on terminal punctuation"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _split_words(text: str, max_size: int, measure: Callable[[str], int]) -> List[str]:
+    """Last resort for a single sentence that is larger than the chunk size"""
+    pieces, current = [], []
+    for word in text.split():
+        if current and measure(" ".join(current + [word])) > max_size:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int, measure: Callable[[str], int] = count_tokens) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens.
+
+    Paragraphs are kept whole when they fit; larger paragraphs are split on
+    sentence boundaries, and only a sentence that is itself too large is cut
+    between words. Neighbouring pieces are packed together up to the limit.
+    Pass measure=len to size chunks in characters instead of tokens.
+    """
+    units = []
+    for paragraph in split_paragraphs(text):
+        if measure(paragraph) <= max_tokens:
+            units.append((paragraph, "\n\n"))
+            continue
+        for sentence in split_sentences(paragraph):
+            if measure(sentence) <= max_tokens:
+                units.append((sentence, " "))
+            else:
+                units.extend((piece, " ") for piece in _split_words(sentence, max_tokens, measure))
+        # Keep the paragraph break after the last sentence of the paragraph
+        units[-1] = (units[-1][0], "\n\n")
+
+    chunks, current, current_tokens = [], "", 0
+    for unit, separator in units:
+        unit_tokens = measure(unit) + measure(separator)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(current.strip())
+            current, current_tokens = "", 0
+        current += unit + separator
+        current_tokens += unit_tokens
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def content_defined_chunks(text: str, target_size: int, max_size: int) -> List[str]:
+    """
+    Split text into chunks of whole sentences whose boundaries depend only
+    on the sentences next to them.
+
+    A chunk ends after a sentence when a hash of that sentence's own text
+    falls below its share of target_size (so chunks average about
+    target_size characters), at every paragraph break, and before a
+    sentence that would take the chunk past max_size. An edit therefore
+    changes the chunk it is in and, at most, the chunks up to the next
+    hash boundary; everything after that keeps the same text. Only a
+    sentence larger than max_size is cut between words.
+    """
+    chunks = []
+    for paragraph in split_paragraphs(text):
+        current = []
+        for sentence in split_sentences(paragraph):
+            pieces = _split_words(sentence, max_size, len) if len(sentence) > max_size else [sentence]
+            for piece in pieces:
+                if current and len(" ".join(current + [piece])) > max_size:
+                    chunks.append(" ".join(current))
+                    current = []
+                current.append(piece)
+                digest = hashlib.sha1(" ".join(piece.split()).encode("utf-8")).digest()
+                if int.from_bytes(digest[:4], "big") % target_size < len(piece):
+                    chunks.append(" ".join(current))
+                    current = []
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+def _is_sentence_break(text: str, start: int, end: int) -> bool:
+    """Whether the whitespace at text[start:end] ends a sentence rather than an abbreviation"""
+    following = text[end:end + 2].lstrip("\"'([")
+    if following[:1].islower():
+        return False
+    word = text[:start].rsplit(None, 1)[-1].lower()
+    # Abbreviations and initials such as "J. Smith"
+    return word not in _ABBREVIATIONS and not (len(word) == 2 and word[0].isalpha())
+
+
+def split_segments(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Split text into sentence segments and the exact whitespace after each.
+
+    Paragraphs break on blank lines and sentences inside them on terminal
+    punctuation followed by a capitalized word, so abbreviations and single
+    (hard-wrapped) line breaks stay inside a segment.
+    "".join(segment + separator) reproduces the input, so segments can be
+    processed independently and reassembled with formatting preserved.
+    """
+    segments, separators = [], []
+    parts = _PARAGRAPH_SEPARATOR.split(text)
+    for paragraph, paragraph_separator in zip(parts[0::2], parts[1::2] + [""]):
+        start = 0
+        for match in _SENTENCE_SEPARATOR.finditer(paragraph):
+            if _is_sentence_break(paragraph, match.start(), match.end()):
+                segments.append(paragraph[start:match.start()])
+                separators.append(match.group())
+                start = match.end()
+        segments.append(paragraph[start:])
+        separators.append(paragraph_separator)
+    return segments, separators
+
+
+def pack_batches(items: Sequence[str], max_chars: int, max_items: int) -> List[List[int]]:
+    """
+    Group item indices, in order, into batches bounded by total characters
+    and item count. An item larger than max_chars gets a batch of its own.
+    """
+    batches, current, current_chars = [], [], 0
+    for index, item in enumerate(items):
+        if current and (current_chars + len(item) > max_chars or len(current) >= max_items):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(index)
+        current_chars += len(item)
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,50 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character heuristic
+    tiktoken = None
+
+# Encoding used by GPT-4o deployments
+ENCODING_NAME = "o200k_base"
+
+# Extra tokens the chat format spends on each message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+# Only texts up to this many characters are memoized: chat messages are
+# re-counted on every turn, while whole documents and prompts are not
+CACHED_TEXT_CHARS = 2000
+
+
+def _count(text: str) -> int:
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    return len(_encoding().encode(text))
+
+
+_count_cached = lru_cache(maxsize=4096)(_count)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens locally, without a round trip to the API.
+
+    Uses tiktoken when it is installed, otherwise estimates roughly four
+    characters per token, which is close enough for budgeting.
+    """
+    if not text:
+        return 0
+    if len(text) <= CACHED_TEXT_CHARS:
+        return _count_cached(text)
+    return _count(text)
+
+
+def count_message_tokens(message: dict) -> int:
+    """Tokens used by a single chat message including the per-message overhead"""
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
@@ -0,0 +1,108 @@
+import threading
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from utils.resilience import get_policy
+
+
+class HttpTransport:
+    """
+    Process-wide HTTP transport with a keep-alive connection pool per host.
+
+    Every page sends its requests through one instance of this class (see
+    get_transport), so TCP and TLS handshakes are paid once per pooled
+    connection instead of once per request or Streamlit rerun.
+    """
+
+    def __init__(self, pool_size=10, max_hosts=10, connect_timeout=5.0, read_timeout=60.0):
+        self.pool_size = pool_size
+        self.max_hosts = max_hosts
+        self.timeout = (connect_timeout, read_timeout)
+
+        # requests/urllib3 only speak HTTP/1.1; connection reuse is what
+        # removes the handshake from the hot path.
+        self._adapter = HTTPAdapter(
+            pool_connections=max_hosts,
+            pool_maxsize=pool_size,
+            pool_block=False,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._request_counts: Dict[str, int] = {}
+
+    def request(self, method, url, provider=None, **kwargs) -> requests.Response:
+        """
+        Send a request through the pooled session, applying the default timeouts.
+
+        With provider set, the request goes through that provider's shared
+        retry/backoff/circuit-breaker policy (see utils.resilience).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        body = kwargs.get("data")
+
+        def send():
+            # Streamed bodies are rewound so a retry sends them from the start
+            if hasattr(body, "seek"):
+                body.seek(0)
+            with self._lock:
+                self._request_counts[host] = self._request_counts.get(host, 0) + 1
+            return self._session.request(method, url, **kwargs)
+
+        if provider is None:
+            return send()
+        return get_policy(provider).call(send)
+
+    def get(self, url, provider=None, **kwargs) -> requests.Response:
+        return self.request("GET", url, provider=provider, **kwargs)
+
+    def post(self, url, provider=None, **kwargs) -> requests.Response:
+        return self.request("POST", url, provider=provider, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Pool hit/miss counters per host.
+
+        A miss is a request that had to open a new connection (and pay for the
+        TCP + TLS handshake); a hit is a request served on a pooled connection.
+        """
+        pools = self._adapter.poolmanager.pools
+        result = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            misses = pool.num_connections
+            hits = max(pool.num_requests - misses, 0)
+            total = hits + misses
+            result[host] = {
+                "requests": self._request_counts.get(host, total),
+                "pool_hits": hits,
+                "pool_misses": misses,
+                "hit_rate": hits / total if total else 0.0,
+                # urllib3 pre-fills the queue with None placeholders; only real connections count
+                "idle_connections": sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool else 0,
+            }
+        return result
+
+    def close(self):
+        self._session.close()
+
+
+@st.cache_resource
+def get_transport() -> HttpTransport:
+    """Return the shared transport, created once per server process"""
+    return HttpTransport(
+        pool_size=int(st.secrets.get("HTTP_POOL_SIZE", 10)),
+        max_hosts=int(st.secrets.get("HTTP_POOL_HOSTS", 10)),
+        connect_timeout=float(st.secrets.get("HTTP_CONNECT_TIMEOUT", 5)),
+        read_timeout=float(st.secrets.get("HTTP_READ_TIMEOUT", 60)),
+    )